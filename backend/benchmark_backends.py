@@ -0,0 +1,132 @@
+import json
+import time
+import random
+import argparse
+import multiprocessing
+
+from inference_backends import BACKENDS, check_parity, load_backend
+from metrics import percentile
+from summarization import SUMMARY_PREFIX
+from synthetic_synthea import make_patient_record
+
+# Compares the inference backends on a fixed corpus of sample notes. Each backend
+# runs in its own process so its RSS is measured in isolation.
+
+REFERENCE_BACKEND = "pytorch"
+GENERATION_PARAMS = {"max_length": 100, "min_length": 20, "do_sample": False}
+
+SAMPLE_NOTES = [
+    "Patient is a 58-year-old male presenting with substernal chest pain radiating to the left arm for two hours. "
+    "ECG shows ST elevation in leads II, III and aVF. Troponin elevated. Taken emergently for cardiac catheterization.",
+    "Follow-up visit for type 2 diabetes mellitus. HbA1c 8.1%, up from 7.4% three months ago. Patient admits to "
+    "dietary non-adherence over the holidays. Metformin increased to 1000 mg twice daily; referred to nutrition.",
+    "Chest X-ray: lungs are clear bilaterally. No pleural effusion or pneumothorax. Cardiomediastinal silhouette "
+    "within normal limits. Impression: no acute cardiopulmonary process.",
+    "Patient reports three days of productive cough, fever to 38.6 C and pleuritic chest pain. Crackles at the right "
+    "lung base. Assessment: community-acquired pneumonia. Started amoxicillin-clavulanate; return if worsening.",
+]
+
+
+def build_corpus(extra_notes=12, seed=7):
+    """The handwritten notes plus deterministic synthetic ones of varied length."""
+    rng = random.Random(seed)
+    notes = list(SAMPLE_NOTES)
+    for i in range(extra_notes):
+        record = make_patient_record(rng, n_reports=1, sentences_per_report=4 + 4 * (i % 4))
+        notes.append(record["reports_text"][0])
+    return [SUMMARY_PREFIX + note for note in notes]
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        # ru_maxrss is in kilobytes on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+
+def run_backend(name, corpus, batch_size, iterations, results):
+    load_started = time.perf_counter()
+    backend = load_backend(name)
+    load_seconds = time.perf_counter() - load_started
+
+    batches = [corpus[i:i + batch_size] for i in range(0, len(corpus), batch_size)]
+    backend.generate(batches[0], **GENERATION_PARAMS)  # Warm-up
+
+    latencies = []
+    generated_tokens = 0
+    outputs = []
+    started = time.perf_counter()
+    for iteration in range(iterations):
+        for batch in batches:
+            batch_started = time.perf_counter()
+            batch_outputs = backend.generate(batch, **GENERATION_PARAMS)
+            latencies.append(time.perf_counter() - batch_started)
+            generated_tokens += sum(
+                len(ids) for ids in backend.tokenizer(batch_outputs, add_special_tokens=False)["input_ids"]
+            )
+            if iteration == 0:
+                outputs.extend(batch_outputs)
+    elapsed = time.perf_counter() - started
+
+    results[name] = {
+        "backend": name,
+        "load_seconds": round(load_seconds, 2),
+        "batches": len(latencies),
+        "tokens_per_sec": round(generated_tokens / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "outputs": outputs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the inference backends on a fixed note corpus.")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--output", help="Write the full results (including outputs) to this JSON file")
+    args = parser.parse_args()
+
+    corpus = build_corpus()
+    names = list(dict.fromkeys([REFERENCE_BACKEND] + args.backends))  # Reference always runs first
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        shared = manager.dict()
+        for name in names:
+            print(f"Benchmarking '{name}'...")
+            process = context.Process(
+                target=run_backend, args=(name, corpus, args.batch_size, args.iterations, shared)
+            )
+            process.start()
+            process.join()
+            if name not in shared:
+                print(f"  '{name}' failed (exit code {process.exitcode}); skipping.")
+        results = dict(shared)
+
+    reference = results.get(REFERENCE_BACKEND)
+    print(f"\n{'backend':<14}{'tokens/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'RSS MB':>10}{'similarity':>12}{'parity':>8}")
+    for name in names:
+        if name not in results:
+            continue
+        result = results[name]
+        if reference:
+            result["parity"] = check_parity(reference["outputs"], result["outputs"])
+        parity = result.get("parity", {})
+        print(
+            f"{name:<14}{result['tokens_per_sec']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+            f"{result['peak_rss_mb']:>10}{parity.get('mean_similarity', '-'):>12}"
+            f"{('ok' if parity.get('passed') else 'FAIL') if parity else '-':>8}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import asyncio
+import hashlib
+import json
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+def normalize_text(text):
+    """Normalizes text so trivially different copies of the same note share a cache entry."""
+    text = unicodedata.normalize("NFC", text)
+    return " ".join(text.split())
+
+
+def make_cache_key(task, text, params, model=None):
+    """
+    Content-addressed key: a hash of the task name, normalized text, generation params
+    and the model/backend that produced the result, so switching backends never serves
+    another backend's output.
+    """
+    payload = json.dumps(
+        {"task": task, "text": normalize_text(text), "params": params, "model": model},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MongoCacheStore:
+    """
+    Optional persistent tier backed by a MongoDB collection.
+    Entries expire through a TTL index on `created_at`.
+    """
+
+    def __init__(self, get_database, collection_name="inference_cache", ttl_seconds=7 * 24 * 3600):
+        self.get_database = get_database
+        self.collection_name = collection_name
+        self.ttl_seconds = ttl_seconds
+
+    async def _collection(self):
+        database = await self.get_database()
+        if database is None:
+            return None
+        return database[self.collection_name]
+
+    async def ensure_indexes(self):
+        collection = await self._collection()
+        if collection is None:
+            return
+        await collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+
+    async def get(self, key):
+        collection = await self._collection()
+        if collection is None:
+            return None
+        document = await collection.find_one({"_id": key}, {"value": 1})
+        return document["value"] if document else None
+
+    async def set(self, key, value):
+        collection = await self._collection()
+        if collection is None:
+            return
+        await collection.replace_one(
+            {"_id": key},
+            {"_id": key, "value": value, "created_at": datetime.now(timezone.utc)},
+            upsert=True,
+        )
+
+
+class ResultCache:
+    """
+    Two-tier cache for generated text.
+
+    The first tier is an in-process LRU bounded by `max_entries`, with a per-entry TTL.
+    The second, optional tier is a persistent store (see MongoCacheStore).
+    Concurrent misses for the same key are collapsed so only one generation runs.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, persistent_store=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent_store = persistent_store
+
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._inflight = {}  # key -> asyncio.Task computing the value
+
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _get_memory(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set_memory(self, key, value):
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _read_persistent(self, key):
+        if self.persistent_store is None:
+            return None
+        try:
+            return await self.persistent_store.get(key)
+        except Exception as e:
+            print(f"Persistent cache read failed: {e}")
+            return None
+
+    async def _write_persistent(self, key, value):
+        if self.persistent_store is None:
+            return
+        try:
+            await self.persistent_store.set(key, value)
+        except Exception as e:
+            print(f"Persistent cache write failed: {e}")
+
+    async def _fill(self, key, compute):
+        try:
+            value = await self._read_persistent(key)
+            if value is not None:
+                self.persistent_hits += 1
+            else:
+                self.misses += 1
+                value = await compute()
+                await self._write_persistent(key, value)
+            self._set_memory(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get_or_compute(self, key, compute):
+        """
+        Returns the cached value for `key`, or awaits `compute()` to produce it.
+        Errors from `compute()` are propagated to every waiter and never cached.
+        """
+        value = self._get_memory(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._fill(key, compute))
+            self._inflight[key] = task
+        # Shield so one caller disconnecting doesn't cancel the generation for the others.
+        return await asyncio.shield(task)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.memory_hits + self.persistent_hits + self.misses + self.coalesced
+        hits = self.memory_hits + self.persistent_hits + self.coalesced
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent_tier": self.persistent_store is not None,
+            "inflight": len(self._inflight),
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
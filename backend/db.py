@@ -1,9 +1,27 @@
+import os
+import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from pymongo.errors import ConnectionFailure # For error handling
 
-# Your MongoDB connection string (for a local server)
-MONGO_CONNECTION_STRING = "mongodb://localhost:27017"
-DATABASE_NAME = "healthcare_assistant_db" # Choose a name for your database
+from metrics import MONGO_COMMAND_LATENCY
+
+# Your MongoDB connection string (for a local server); MONGO_URI / MONGO_DATABASE override
+# them, e.g. so the load-test harness can point the app at a throwaway database.
+MONGO_CONNECTION_STRING = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
+DATABASE_NAME = os.environ.get("MONGO_DATABASE", "healthcare_assistant_db") # Choose a name for your database
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Records the duration of every MongoDB command the driver runs, for /metrics."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_LATENCY.observe(event.duration_micros / 1e6, command=event.command_name, outcome="success")
+
+    def failed(self, event):
+        MONGO_COMMAND_LATENCY.observe(event.duration_micros / 1e6, command=event.command_name, outcome="failure")
 
 class DataBase:
     client: AsyncIOMotorClient = None
@@ -12,7 +30,7 @@ db = DataBase() # Global object to hold the client
 
 async def connect_to_mongo():
     print("Attempting to connect to MongoDB...")
-    db.client = AsyncIOMotorClient(MONGO_CONNECTION_STRING)
+    db.client = AsyncIOMotorClient(MONGO_CONNECTION_STRING, event_listeners=[MongoCommandTimer()])
     try:
         # The ismaster command is cheap and does not require auth.
         await db.client.admin.command('ismaster')
@@ -27,6 +45,40 @@ async def close_mongo_connection():
         db.client.close()
         print("MongoDB connection closed.")
 
+async def ping_mongo() -> bool:
+    """Cheap readiness check: True if the client exists and the server answers a ping."""
+    if db.client is None:
+        return False
+    try:
+        # Bounded so a probe never waits out the driver's server selection timeout.
+        await asyncio.wait_for(db.client.admin.command('ping'), timeout=2)
+        return True
+    except Exception:
+        return False
+
+async def ensure_patient_indexes(database):
+    """
+    Creates the indexes /patients/search relies on. create_index is a no-op when the
+    index already exists, so this is safe to run on every startup. main.py runs it in
+    the background so a large first build doesn't hold up serving.
+    """
+    patients = database.patients
+    # Serves both anchored name-prefix regexes and the (name_lower, _id) keyset paging.
+    await patients.create_index([("name_lower", 1), ("_id", 1)], name="name_lower_id")
+    if "name_lower_prefix" in await patients.index_information():
+        await patients.drop_index("name_lower_prefix")  # Superseded by name_lower_id
+    await patients.create_index([("gender", 1), ("birthDate", 1)], name="gender_birthDate")
+    await patients.create_index([("birthDate", 1)], name="birthDate")
+    await patients.create_index([("reports_text", "text")], name="reports_text_search", default_language="english")
+    # Backfill name_lower for records loaded before it existed. Missing fields are indexed
+    # as null, so this lookup goes through name_lower_id instead of scanning.
+    result = await patients.update_many(
+        {"name_lower": None},
+        [{"$set": {"name_lower": {"$toLower": "$name"}}}],
+    )
+    if result.modified_count:
+        print(f"Backfilled name_lower on {result.modified_count} patient records.")
+
 async def get_database() -> AsyncIOMotorClient:
     if db.client is None:
         # This scenario should ideally be handled by ensuring connect_to_mongo is called at startup.
@@ -0,0 +1,36 @@
+import os
+import time
+
+# Multi-worker deployment: gunicorn -c gunicorn.conf.py main:app
+#
+# With preload_app the master imports main.py (and, through PRELOAD_MODEL, loads the
+# model weights) once before forking. Workers share those pages copy-on-write instead
+# of each loading their own copy, and each worker only runs a short warm-up generation.
+# Only the fp32 CPU backend is preloaded; int8, ONNX and CUDA load in each worker
+# (see ModelManager.preload).
+
+os.environ.setdefault("PRELOAD_MODEL", "1")
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+_master_started = time.perf_counter()
+
+
+def when_ready(server):
+    server.log.info(f"Master ready (app and model preloaded) in {time.perf_counter() - _master_started:.2f}s")
+
+
+def post_fork(server, worker):
+    # Each worker gets its own math-library thread pool; keep them from oversubscribing the CPU.
+    # server.cfg.workers includes a --workers override from the command line. torch is already
+    # imported in the preloaded master, so OMP_NUM_THREADS would be read too late to matter here.
+    threads = max(1, (os.cpu_count() or 1) // server.cfg.workers)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
@@ -0,0 +1,226 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import percentile
+
+MODEL_NAME = "t5-small"
+
+
+class EngineOverloadedError(Exception):
+    """Raised when the inference queue is full and a request cannot be accepted."""
+
+
+class EngineNotRunningError(Exception):
+    """Raised when a request is submitted before start() or after stop()."""
+
+
+class LatencyStats:
+    """Running count/sum/max plus a sliding window of samples for percentiles."""
+
+    def __init__(self, window=1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self._samples.append(seconds)
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(percentile(self._samples, 50) * 1000, 3),
+            "p99_ms": round(percentile(self._samples, 99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class _Request:
+    __slots__ = ("text", "params_key", "params", "future", "enqueued_at")
+
+    def __init__(self, text, params, future):
+        self.text = text
+        self.params = params
+        # Requests can only share a batch if they use identical generation settings.
+        self.params_key = tuple(sorted(params.items()))
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchingInferenceEngine:
+    """
+    Collects concurrent generation requests into padded batches and runs them
+    on a dedicated worker thread, so the event loop is never blocked by the model.
+
+    A batch is closed as soon as it reaches `max_batch_size` or `max_wait_ms`
+    has passed since its first request arrived, whichever comes first.
+    `generate_fn(texts, **params)` must return one string per input text.
+    """
+
+    def __init__(self, generate_fn, max_batch_size=8, max_wait_ms=20, max_queue_size=256):
+        self.generate_fn = generate_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+
+        self._queue = None
+        self._carry = deque()  # Requests pulled off the queue that didn't fit the last batch
+        # The batch being collected or run, and requests set aside while collecting it.
+        # Kept here rather than in locals so stop() can fail them too.
+        self._batch = []
+        self._skipped = []
+        self._worker = None
+        # A single thread: batches run one at a time while the queue fills up behind them.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+        self.batches_run = 0
+        self.requests_served = 0
+        self.requests_failed = 0
+        self.batch_sizes = {}
+        self.queue_wait = LatencyStats()
+        self.inference_time = LatencyStats()
+        self.total_latency = LatencyStats()
+
+    @property
+    def running(self):
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        # Fail anything still waiting so callers don't hang forever, including the batch the
+        # worker was running: cancelling the worker abandons it mid-generation.
+        pending = self._batch + self._skipped + list(self._carry)
+        self._batch, self._skipped = [], []
+        self._carry.clear()
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for request in pending:
+            if not request.future.done():
+                request.future.set_exception(EngineNotRunningError("Inference engine stopped."))
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, text, **params):
+        if not self.running:
+            raise EngineNotRunningError("Inference engine is not running.")
+        future = asyncio.get_running_loop().create_future()
+        request = _Request(text, params, future)
+        try:
+            self._queue.put_nowait(request)
+        except asyncio.QueueFull:
+            raise EngineOverloadedError(
+                f"Inference queue is full ({self.max_queue_size} pending requests)."
+            )
+        result = await future
+        self.total_latency.record(time.perf_counter() - request.enqueued_at)
+        return result
+
+    def queue_depth(self):
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + len(self._carry)
+
+    def metrics(self):
+        return {
+            "running": self.running,
+            "queue_depth": self.queue_depth(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches_run": self.batches_run,
+            "requests_served": self.requests_served,
+            "requests_failed": self.requests_failed,
+            "mean_batch_size": round(self.requests_served / self.batches_run, 3) if self.batches_run else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            "latency": {
+                "queue_wait": self.queue_wait.snapshot(),
+                "inference": self.inference_time.snapshot(),
+                "total": self.total_latency.snapshot(),
+            },
+        }
+
+    # --- Worker internals ---
+
+    async def _next_request(self, timeout=None):
+        if self._carry:
+            return self._carry.popleft()
+        if timeout is None:
+            return await self._queue.get()
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+    async def _collect_batch(self):
+        loop = asyncio.get_running_loop()
+        first = await self._next_request()
+        self._batch = batch = [first]
+        self._skipped = skipped = []
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                request = await self._next_request(timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if request.params_key == first.params_key:
+                batch.append(request)
+            else:
+                skipped.append(request)
+
+        # Requests with other generation settings go first in line for the next batch.
+        self._carry.extendleft(reversed(skipped))
+        self._skipped = []
+        # Drop requests whose callers already went away (e.g. client disconnected).
+        self._batch = [request for request in batch if not request.future.done()]
+        return self._batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for request in batch:
+                self.queue_wait.record(started - request.enqueued_at)
+
+            texts = [request.text for request in batch]
+            try:
+                outputs = await loop.run_in_executor(
+                    self._executor, lambda: self.generate_fn(texts, **batch[0].params)
+                )
+            except Exception as e:
+                print(f"Error during batched inference: {e}")
+                self.requests_failed += len(batch)
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            finally:
+                self.inference_time.record(time.perf_counter() - started)
+
+            self.batches_run += 1
+            self.requests_served += len(batch)
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            for request, output in zip(batch, outputs):
+                if not request.future.done():
+                    request.future.set_result(output)
+            self._batch = []
+
@@ -0,0 +1,144 @@
+import os
+import difflib
+
+from inference import MODEL_NAME
+from metrics import INFERENCE_STAGE_LATENCY
+
+# Select with the INFERENCE_BACKEND environment variable: "pytorch", "pytorch-int8" or "onnx".
+DEFAULT_BACKEND = os.environ.get("INFERENCE_BACKEND", "pytorch")
+MAX_INPUT_TOKENS = 512  # t5-small's context window
+ONNX_EXPORT_DIR = os.environ.get("ONNX_EXPORT_DIR", os.path.join(os.path.dirname(__file__), "onnx_models"))
+
+
+class Seq2SeqBackend:
+    """
+    Shared generation interface for every backend: tokenize a batch with padding,
+    call `model.generate`, and decode. Subclasses only decide how the model is built.
+    """
+
+    name = None
+
+    def __init__(self, model_name=MODEL_NAME):
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = self._load_model()
+
+    def _load_model(self):
+        raise NotImplementedError
+
+    @property
+    def device(self):
+        return "cpu"
+
+    def generate(self, texts, max_length=150, min_length=30, do_sample=False, **params):
+        import torch
+
+        with INFERENCE_STAGE_LATENCY.time(backend=self.name, stage="tokenize"):
+            inputs = self.tokenizer(
+                texts, return_tensors="pt", padding=True, truncation=True, max_length=MAX_INPUT_TOKENS
+            ).to(self.device)
+        with INFERENCE_STAGE_LATENCY.time(backend=self.name, stage="generate"), torch.inference_mode():
+            output_ids = self.model.generate(
+                **inputs, max_length=max_length, min_length=min_length, do_sample=do_sample, **params
+            )
+        with INFERENCE_STAGE_LATENCY.time(backend=self.name, stage="decode"):
+            return self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)
+
+    def describe(self):
+        return {"backend": self.name, "model_name": self.model_name, "device": self.device}
+
+
+class PyTorchBackend(Seq2SeqBackend):
+    """The stock fp32 PyTorch model (what the original pipeline ran)."""
+
+    name = "pytorch"
+
+    def _load_model(self):
+        import torch
+        from transformers import AutoModelForSeq2SeqLM
+
+        self._device = "cuda" if torch.cuda.is_available() else "cpu"
+        return AutoModelForSeq2SeqLM.from_pretrained(self.model_name).to(self._device).eval()
+
+    @property
+    def device(self):
+        return self._device
+
+
+class QuantizedPyTorchBackend(Seq2SeqBackend):
+    """fp32 model with its Linear layers dynamically quantized to int8 (CPU only)."""
+
+    name = "pytorch-int8"
+
+    def _load_model(self):
+        import torch
+        from transformers import AutoModelForSeq2SeqLM
+
+        model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name).eval()
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxRuntimeBackend(Seq2SeqBackend):
+    """
+    Encoder/decoder exported to ONNX and run with ONNX Runtime, decoding with the
+    KV cache (decoder-with-past). Needs the optional `optimum[onnxruntime]` package.
+    The export is saved under ONNX_EXPORT_DIR and reused on later starts.
+    """
+
+    name = "onnx"
+
+    def _load_model(self):
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        except ImportError as e:
+            raise RuntimeError(
+                "The onnx backend requires optimum with ONNX Runtime: pip install 'optimum[onnxruntime]'"
+            ) from e
+
+        export_path = os.path.join(ONNX_EXPORT_DIR, self.model_name.replace("/", "__"))
+        if os.path.isdir(export_path):
+            return ORTModelForSeq2SeqLM.from_pretrained(export_path, use_cache=True)
+
+        model = ORTModelForSeq2SeqLM.from_pretrained(self.model_name, export=True, use_cache=True)
+        model.save_pretrained(export_path)
+        self.tokenizer.save_pretrained(export_path)
+        return model
+
+
+BACKENDS = {
+    PyTorchBackend.name: PyTorchBackend,
+    QuantizedPyTorchBackend.name: QuantizedPyTorchBackend,
+    OnnxRuntimeBackend.name: OnnxRuntimeBackend,
+}
+
+
+def load_backend(name=None, model_name=MODEL_NAME):
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}'. Choose one of: {', '.join(BACKENDS)}")
+    backend = BACKENDS[name](model_name)
+    print(f"Successfully loaded {model_name} with the '{name}' backend on device: {backend.device}")
+    return backend
+
+
+def check_parity(reference_outputs, candidate_outputs, min_similarity=0.9):
+    """
+    Compares a candidate backend's outputs against the reference backend's outputs for
+    the same inputs. Returns the exact-match rate and the mean character-level similarity.
+    """
+    if len(reference_outputs) != len(candidate_outputs):
+        raise ValueError("Parity check needs one candidate output per reference output.")
+    similarities = [
+        difflib.SequenceMatcher(None, reference, candidate).ratio()
+        for reference, candidate in zip(reference_outputs, candidate_outputs)
+    ]
+    exact = sum(reference == candidate for reference, candidate in zip(reference_outputs, candidate_outputs))
+    mean_similarity = sum(similarities) / len(similarities) if similarities else 1.0
+    return {
+        "exact_match_rate": round(exact / len(similarities), 4) if similarities else 1.0,
+        "mean_similarity": round(mean_similarity, 4),
+        "min_similarity": round(min(similarities), 4) if similarities else 1.0,
+        "passed": mean_similarity >= min_similarity,
+    }
@@ -1,109 +1,336 @@
 import os
+import sys
 import json
+import time
 import asyncio
+import argparse
 import base64
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne
 from pymongo.errors import ConnectionFailure
 
+from summary_index import SUMMARIES_COLLECTION, run_index_build
+
+try:
+    import ijson  # Optional: streaming JSON parser, avoids holding a whole bundle tree in memory
+except ImportError:
+    ijson = None
+
 # --- Configuration ---
-SYNTHEA_OUTPUT_DIR = r"E:\Tools\synthea\output\fhir" 
+SYNTHEA_OUTPUT_DIR = r"E:\Tools\synthea\output\fhir"
 MONGO_CONNECTION_STRING = "mongodb://localhost:27017"
 DATABASE_NAME = "healthcare_assistant_db"
 COLLECTION_NAME = "patients"
+MANIFEST_FILE_NAME = ".ingest_manifest.json"  # Stored inside the Synthea output directory
+DEFAULT_WORKERS = os.cpu_count() or 2
+DEFAULT_BATCH_SIZE = 500  # Patient records per bulk_write
+MAX_INFLIGHT_PER_WORKER = 4  # Bounds how many parsed bundles can wait in memory
 
-# --- Main Logic ---
+# --- Parsing (runs in worker processes) ---
 
 def get_patient_id_from_reference(reference_str):
     """Helper function to extract patient ID from a reference string like 'urn:uuid:...'"""
     return reference_str.replace("urn:uuid:", "")
 
-async def load_data():
-    """
-    Connects to MongoDB, finds Synthea JSON files, aggregates data, 
-    assembles patient records (without conditions/meds), and inserts them.
-    """
-    print("--- SCRIPT START ---")
-    try:
-        client = AsyncIOMotorClient(MONGO_CONNECTION_STRING)
-        await client.admin.command('ismaster')
-        db = client[DATABASE_NAME]
-        collection = db[COLLECTION_NAME]
-        print("Successfully connected to MongoDB.")
-    except ConnectionFailure as e:
-        print(f"MongoDB connection failed: {e}")
-        return
 
-    if not os.path.exists(SYNTHEA_OUTPUT_DIR):
-        print(f"Error: Directory not found -> {SYNTHEA_OUTPUT_DIR}")
-        client.close()
+class HashingReader:
+    """File wrapper that hashes bytes as the parser reads them, so each bundle is read only once."""
+
+    def __init__(self, f):
+        self.f = f
+        self.hasher = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.hasher.update(data)
+        return data
+
+
+def iter_resources(f):
+    if ijson is not None:
+        yield from ijson.items(f, 'entry.item.resource', use_float=True)
         return
+    data = json.load(f)
+    for entry in data.get('entry', []):
+        yield entry.get('resource', {})
 
-    json_files = [f for f in os.listdir(SYNTHEA_OUTPUT_DIR) if f.endswith('.json')]
-    print(f"Found {len(json_files)} JSON files to process.")
 
-    print("\n--- STAGE 1: Reading all files and gathering resources... ---")
+def parse_bundle(file_path):
+    """
+    Parses one Synthea FHIR bundle and returns its patient records with their decoded
+    DiagnosticReport texts attached, plus the sha256 of the file contents.
+    """
     patients = {}
-    reports = {} # We only need to gather patients and reports now
-
-    for file_name in json_files:
-        file_path = os.path.join(SYNTHEA_OUTPUT_DIR, file_name)
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            if 'entry' not in data: continue
-
-            for entry in data['entry']:
-                resource = entry.get('resource', {})
-                resource_type = resource.get('resourceType')
-                
-                if resource_type == 'Patient':
-                    patient_id = resource.get('id')
-                    if patient_id:
-                        name_data = resource.get('name', [{}])[0]
-                        patients[patient_id] = {
-                            "_id": patient_id,
-                            "name": f"{' '.join(name_data.get('given', []))} {name_data.get('family', '')}",
-                            "gender": resource.get('gender'),
-                            "birthDate": resource.get('birthDate')
-                        }
-
-                elif resource_type == 'DiagnosticReport':
-                    patient_ref_obj = resource.get('subject')
-                    if not patient_ref_obj or 'reference' not in patient_ref_obj: continue
-                    
-                    patient_id = get_patient_id_from_reference(patient_ref_obj['reference'])
-                    
-                    presented_form = resource.get('presentedForm')
-                    if presented_form and isinstance(presented_form, list) and len(presented_form) > 0:
-                        encoded_data = presented_form[0].get('data')
-                        if encoded_data:
-                            decoded_bytes = base64.b64decode(encoded_data)
-                            decoded_string = decoded_bytes.decode('utf-8')
-                            reports.setdefault(patient_id, []).append(decoded_string)
-
-    print(f"Gathered {len(patients)} unique patients and their report data.")
-    
-    print("\n--- STAGE 2: Assembling complete patient records... ---")
-    final_patient_records = []
+    reports = {}
+
+    with open(file_path, 'rb') as raw:
+        reader = HashingReader(raw)
+        for resource in iter_resources(reader):
+            resource_type = resource.get('resourceType')
+
+            if resource_type == 'Patient':
+                patient_id = resource.get('id')
+                if patient_id:
+                    name_data = resource.get('name', [{}])[0]
+                    name = f"{' '.join(name_data.get('given', []))} {name_data.get('family', '')}"
+                    patients[patient_id] = {
+                        "_id": patient_id,
+                        "name": name,
+                        "name_lower": name.lower(),  # Indexed for case-insensitive prefix search
+                        "gender": resource.get('gender'),
+                        "birthDate": resource.get('birthDate')
+                    }
+
+            elif resource_type == 'DiagnosticReport':
+                patient_ref_obj = resource.get('subject')
+                if not patient_ref_obj or 'reference' not in patient_ref_obj: continue
+
+                patient_id = get_patient_id_from_reference(patient_ref_obj['reference'])
+
+                presented_form = resource.get('presentedForm')
+                if presented_form and isinstance(presented_form, list) and len(presented_form) > 0:
+                    encoded_data = presented_form[0].get('data')
+                    if encoded_data:
+                        decoded_bytes = base64.b64decode(encoded_data)
+                        decoded_string = decoded_bytes.decode('utf-8')
+                        reports.setdefault(patient_id, []).append(decoded_string)
+        # Drain anything the parser didn't consume so the hash covers the whole file.
+        while reader.read(1 << 16):
+            pass
+
+    records = []
     for patient_id, patient_data in patients.items():
-        # Only add the reports_text field now
-        patient_data['reports_text'] = reports.get(patient_id, [])
-        final_patient_records.append(patient_data)
-    print(f"Assembled {len(final_patient_records)} final records.")
+        patient_data['reports_text'] = reports.pop(patient_id, [])
+        records.append(patient_data)
+    # Synthea writes one bundle per patient; reports pointing outside the bundle are skipped.
+    orphan_reports = sum(len(texts) for texts in reports.values())
+
+    return {
+        "file_path": file_path,
+        "sha256": reader.hasher.hexdigest(),
+        "records": records,
+        "orphan_reports": orphan_reports,
+    }
+
+# --- Checkpoint manifest ---
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read manifest {manifest_path} ({e}); doing a full ingest.")
+        return {}
+
+
+def save_manifest(manifest_path, manifest):
+    # Write to a temp file and rename so an interrupted run never leaves a corrupt manifest.
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
 
-    if final_patient_records:
-        print(f"\n--- STAGE 3: Clearing database and inserting {len(final_patient_records)} complete records... ---")
+def plan_files(input_dir, manifest, full):
+    """Splits the bundles on disk into those that need ingesting and those unchanged since last run."""
+    to_process = []
+    current = {}
+    for file_name in sorted(os.listdir(input_dir)):
+        # Skip the manifest itself (it is also a .json file in the same directory).
+        if not file_name.endswith('.json') or file_name == MANIFEST_FILE_NAME:
+            continue
+        stat = os.stat(os.path.join(input_dir, file_name))
+        current[file_name] = {"mtime": stat.st_mtime, "size": stat.st_size}
+        previous = manifest.get(file_name)
+        if full or previous is None or previous.get("mtime") != stat.st_mtime or previous.get("size") != stat.st_size:
+            to_process.append(file_name)
+    removed = [file_name for file_name in manifest if file_name not in current]
+    return to_process, current, removed
+
+# --- Main Logic ---
+
+class IngestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.files = 0
+        self.unchanged = 0
+        self.records = 0
+        self.reports = 0
+        self.orphan_reports = 0
+
+    def report(self, prefix=""):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        print(
+            f"{prefix}{self.files} files ({self.files / elapsed:.1f} files/sec), "
+            f"{self.records} records ({self.records / elapsed:.1f} records/sec), "
+            f"{self.reports} reports, {self.unchanged} unchanged, in {elapsed:.1f}s"
+        )
+
+
+async def load_data(input_dir=SYNTHEA_OUTPUT_DIR, workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE,
+                    full=False, prune=True, mongo_uri=MONGO_CONNECTION_STRING, client=None):
+    """
+    Connects to MongoDB and incrementally ingests Synthea bundles.
+
+    Bundles are parsed across a process pool. Patient records are upserted in
+    bounded, ordered bulk_write batches, so the collection is never emptied
+    mid-reload. A manifest of file mtime/size/hash means re-runs only touch new
+    or changed bundles. `full` re-ingests every bundle but still prunes deleted ones.
+
+    An already connected `client` can be passed in; it is then left open for the
+    caller. Returns the run's IngestStats, or None if the run failed.
+    """
+    print("--- SCRIPT START ---")
+    owns_client = client is None
+    if owns_client:
         try:
-            delete_result = await collection.delete_many({})
-            print(f"Cleared {delete_result.deleted_count} existing patient records.")
-            
-            result = await collection.insert_many(final_patient_records)
-            print(f"Successfully inserted {len(result.inserted_ids)} new records.")
-        except Exception as e:
-            print(f"An error occurred during database insertion: {e}")
+            client = AsyncIOMotorClient(mongo_uri)
+            await client.admin.command('ismaster')
+            print("Successfully connected to MongoDB.")
+        except ConnectionFailure as e:
+            print(f"MongoDB connection failed: {e}")
+            return None
+    db = client[DATABASE_NAME]
+    collection = db[COLLECTION_NAME]
+    summaries = db[SUMMARIES_COLLECTION]
+
+    if not os.path.exists(input_dir):
+        print(f"Error: Directory not found -> {input_dir}")
+        if owns_client:
+            client.close()
+        return None
+
+    manifest_path = os.path.join(input_dir, MANIFEST_FILE_NAME)
+    # Loaded even for --full: the manifest is the only record of which patients came from
+    # bundles that have since been deleted, so pruning needs it either way.
+    manifest = load_manifest(manifest_path)
+    to_process, current, removed = plan_files(input_dir, manifest, full)
+    stats = IngestStats()
+    stats.unchanged = len(current) - len(to_process)
+    print(f"Found {len(current)} JSON files: {len(to_process)} new or changed, {stats.unchanged} unchanged, {len(removed)} removed.")
+    if ijson is None:
+        print("ijson is not installed; falling back to json.load for parsing.")
+
+    if prune and removed:
+        stale_ids = [pid for file_name in removed for pid in manifest[file_name].get("patient_ids", [])]
+        if stale_ids:
+            delete_result = await collection.delete_many({"_id": {"$in": stale_ids}})
+            await summaries.delete_many({"_id": {"$in": stale_ids}})
+            print(f"Removed {delete_result.deleted_count} patients whose bundles no longer exist.")
+        for file_name in removed:
+            manifest.pop(file_name, None)
+        save_manifest(manifest_path, manifest)
+
+    loop = asyncio.get_running_loop()
+    operations = []
+    changed_ids = []  # Patient ids of the records in `operations`
+    pending_manifest = {}  # Manifest entries for files whose records are in `operations`
+
+    async def flush():
+        if operations:
+            await collection.bulk_write(operations, ordered=True)
+            # Precomputed summaries of these patients describe their old reports. Dropping
+            # them makes /patients/{id}/summary a real miss that regenerates live.
+            await summaries.delete_many({"_id": {"$in": changed_ids}})
+            operations.clear()
+            changed_ids.clear()
+        if pending_manifest:
+            manifest.update(pending_manifest)
+            pending_manifest.clear()
+            save_manifest(manifest_path, manifest)
+
+    print(f"\n--- Parsing with {workers} worker processes, writing batches of {batch_size} records... ---")
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            inflight = deque()
+            files = iter(to_process)
+            max_inflight = workers * MAX_INFLIGHT_PER_WORKER
+
+            def submit_next():
+                file_name = next(files, None)
+                if file_name is None:
+                    return
+                path = os.path.join(input_dir, file_name)
+                inflight.append((file_name, loop.run_in_executor(pool, parse_bundle, path)))
+
+            for _ in range(max_inflight):
+                submit_next()
+
+            # Results are consumed in submission order, keeping the writes ordered.
+            while inflight:
+                file_name, future = inflight.popleft()
+                submit_next()
+                try:
+                    result = await future
+                except Exception as e:
+                    print(f"Skipping {file_name}: {e}")
+                    continue
+
+                previous = manifest.get(file_name, {})
+                entry = dict(current[file_name], sha256=result["sha256"],
+                             patient_ids=[record["_id"] for record in result["records"]])
+                stats.files += 1
+                stats.orphan_reports += result["orphan_reports"]
+
+                # Touched but identical content: only refresh the manifest entry.
+                if full or previous.get("sha256") != result["sha256"]:
+                    for record in result["records"]:
+                        operations.append(ReplaceOne({"_id": record["_id"]}, record, upsert=True))
+                        changed_ids.append(record["_id"])
+                        stats.records += 1
+                        stats.reports += len(record["reports_text"])
+                pending_manifest[file_name] = entry
+
+                if len(operations) >= batch_size:
+                    await flush()
+                    stats.report(prefix="  progress: ")
+            await flush()
+    except Exception as e:
+        # The manifest only advances after a successful flush, so a re-run picks up
+        # every file whose records didn't make it into the database.
+        print(f"An error occurred during ingestion: {e}")
+        stats.report(prefix="\nIngestion FAILED after ")
+        return None
+    finally:
+        if owns_client:
+            client.close()
+
+    if stats.orphan_reports:
+        print(f"Skipped {stats.orphan_reports} reports whose patient was not in the same bundle.")
+    stats.report(prefix="\nIngested ")
+    print("Data loading complete.")
+    return stats
+
 
-    client.close()
-    print("\nMongoDB connection closed. Data loading complete.")
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load Synthea FHIR bundles into MongoDB.")
+    parser.add_argument("--dir", default=SYNTHEA_OUTPUT_DIR, help="Synthea FHIR output directory")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Parser processes")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Records per bulk_write")
+    parser.add_argument("--full", action="store_true", help="Re-ingest every bundle, even unchanged ones (deleted bundles are still pruned)")
+    parser.add_argument("--no-prune", action="store_true", help="Keep patients whose bundles were deleted")
+    parser.add_argument("--build-summaries", action="store_true",
+                        help="Refresh the precomputed patient_summaries index after ingesting")
+    parser.add_argument("--mongo-uri", default=MONGO_CONNECTION_STRING)
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    asyncio.run(load_data())
\ No newline at end of file
+    args = parse_args()
+    stats = asyncio.run(load_data(
+        input_dir=args.dir,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        full=args.full,
+        prune=not args.no_prune,
+        mongo_uri=args.mongo_uri,
+    ))
+    if stats is None:
+        sys.exit(1)
+    if args.build_summaries:
+        asyncio.run(run_index_build(args.mongo_uri))
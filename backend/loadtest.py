@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import itertools
+import asyncio
+import argparse
+import subprocess
+from datetime import datetime, timezone
+
+from measure_startup import wait_until_ready
+from metrics import percentile
+from synthetic_synthea import make_patient_record
+
+# Reproducible load test for /patients, /summarize_note and /explain_note.
+#
+# By default it seeds a throwaway database on a local mongod with synthetic
+# Synthea-like patients, starts the app against it, drives each endpoint at the
+# requested concurrency levels and writes a JSON report (throughput, p50/p90/p99)
+# tagged with the current git commit. Use --compare to diff two reports.
+#
+#   python loadtest.py --concurrency 1 8 32
+#   python loadtest.py --base-url http://127.0.0.1:8000   # an already running server
+#   python loadtest.py --compare bench_results/a.json bench_results/b.json
+
+BENCH_DATABASE = "healthcare_bench"
+DEFAULT_ENDPOINTS = ["patients", "summarize_note", "explain_note"]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results")
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], text=True).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def seed_database(mongo_uri, database_name, patients, seed):
+    """Replaces the benchmark database with `patients` deterministic synthetic records."""
+    from pymongo import MongoClient
+
+    rng = random.Random(seed)
+    client = MongoClient(mongo_uri)
+    try:
+        client.drop_database(database_name)
+        collection = client[database_name].patients
+        batch = []
+        for _ in range(patients):
+            batch.append(make_patient_record(rng, n_reports=rng.randint(1, 6)))
+            if len(batch) >= 1000:
+                collection.insert_many(batch)
+                batch = []
+        if batch:
+            collection.insert_many(batch)
+    finally:
+        client.close()
+    print(f"Seeded {patients} synthetic patients into {database_name}.")
+
+
+CACHE_COUNTERS = ["memory_hits", "persistent_hits", "coalesced", "misses"]
+
+
+def make_note_source(pool_size, seed):
+    """
+    Returns a callable giving the next note to send. With pool_size 0 (the default) every
+    request gets a note no earlier run has sent, so the note endpoints measure generation
+    rather than the result cache. A positive pool_size cycles through that many notes.
+    """
+    rng = random.Random(seed + 1)
+    if pool_size > 0:
+        pool = [make_patient_record(rng, n_reports=1)["reports_text"][0] for _ in range(pool_size)]
+        return lambda: rng.choice(pool)
+
+    # The run id keeps notes unique across runs too, since the cache can persist in Mongo.
+    run_id = uuid.uuid4().hex[:8]
+    counter = itertools.count()
+    return lambda: f"Note {run_id}-{next(counter)}. " + make_patient_record(rng, n_reports=1)["reports_text"][0]
+
+
+async def fetch_cache_counters(client):
+    """The server's cache counters, or None if it has no /cache/stats (older commits)."""
+    try:
+        response = await client.get("/cache/stats")
+    except Exception:
+        return None
+    if response.status_code != 200:
+        return None
+    stats = response.json()
+    return {name: stats.get(name, 0) for name in CACHE_COUNTERS}
+
+
+async def drive_endpoint(client, endpoint, concurrency, total_requests, next_note, seed):
+    """Closed-loop load: `concurrency` workers issue requests back to back until `total_requests` are done."""
+    latencies = []
+    errors = 0
+    remaining = total_requests
+
+    async def worker(worker_id):
+        nonlocal remaining, errors
+        cursor = None
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                if endpoint == "patients":
+                    # Walk the collection page by page, like a user scrolling the list.
+                    response = await client.get("/patients", params={"after": cursor} if cursor else {})
+                    if response.status_code == 200:
+                        body = response.json()
+                        # Before keyset pagination /patients returned a bare list of every patient.
+                        cursor = body.get("next_cursor") if isinstance(body, dict) else None
+                else:
+                    response = await client.post(f"/{endpoint}", json={"medical_text": next_note()})
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    duration = time.perf_counter() - started
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 2) if duration else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+async def run_load(base_url, endpoints, concurrency_levels, requests, next_note, seed, warmup):
+    import httpx
+
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        for endpoint in endpoints:
+            if warmup:
+                await drive_endpoint(client, endpoint, 1, warmup, next_note, seed)
+            for concurrency in concurrency_levels:
+                before = await fetch_cache_counters(client)
+                result = await drive_endpoint(client, endpoint, concurrency, requests, next_note, seed)
+                after = await fetch_cache_counters(client)
+                # What the result cache did during this level, so cached and uncached runs aren't confused.
+                result["cache"] = (
+                    {name: after[name] - before[name] for name in CACHE_COUNTERS} if before and after else None
+                )
+                cache_note = ""
+                if endpoint != "patients" and result["cache"]:
+                    hits = result["cache"]["memory_hits"] + result["cache"]["persistent_hits"] + result["cache"]["coalesced"]
+                    cache_note = f"  cache hits {hits} misses {result['cache']['misses']}"
+                print(f"  {endpoint:<15} c={concurrency:<4} {result['throughput_rps']:>8} req/s  "
+                      f"p50 {result['p50_ms']:>9} ms  p99 {result['p99_ms']:>9} ms  errors {result['errors']}{cache_note}")
+                results.append(result)
+        metrics_text = (await client.get("/metrics")).text
+    return results, metrics_text
+
+
+def print_comparison(old_path, new_path):
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    old_results = {(r["endpoint"], r["concurrency"]): r for r in old["results"]}
+
+    def delta(before, after, higher_is_better):
+        if not before:
+            return "    n/a"
+        change = (after - before) / before * 100
+        better = change >= 0 if higher_is_better else change <= 0
+        return f"{change:+6.1f}%{'' if better else ' !'}"
+
+    print(f"Comparing {old['commit']} -> {new['commit']}")
+    print(f"{'endpoint':<15}{'c':>5}{'req/s':>12}{'Δ':>10}{'p50 ms':>12}{'Δ':>10}{'p99 ms':>12}{'Δ':>10}")
+    for result in new["results"]:
+        before = old_results.get((result["endpoint"], result["concurrency"]))
+        if before is None:
+            continue
+        print(
+            f"{result['endpoint']:<15}{result['concurrency']:>5}"
+            f"{result['throughput_rps']:>12}{delta(before['throughput_rps'], result['throughput_rps'], True):>10}"
+            f"{result['p50_ms']:>12}{delta(before['p50_ms'], result['p50_ms'], False):>10}"
+            f"{result['p99_ms']:>12}{delta(before['p99_ms'], result['p99_ms'], False):>10}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the backend and record latency/throughput.")
+    parser.add_argument("--base-url", help="Drive an already running server instead of starting one")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default=BENCH_DATABASE, help="Throwaway database to seed and serve from")
+    parser.add_argument("--patients", type=int, default=2000, help="Synthetic patients to seed")
+    parser.add_argument("--endpoints", nargs="+", default=DEFAULT_ENDPOINTS, choices=DEFAULT_ENDPOINTS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint per concurrency level")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests per endpoint")
+    parser.add_argument("--note-pool", type=int, default=0,
+                        help="Cycle through this many distinct notes to measure cached throughput "
+                             "(default 0: a fresh note per request, so every generation is a cache miss)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--output-dir", default=RESULTS_DIR)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Diff two saved reports and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        print_comparison(*args.compare)
+        return
+
+    next_note = make_note_source(args.note_pool, args.seed)
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        seed_database(args.mongo_uri, args.database, args.patients, args.seed)
+        env = dict(os.environ, MONGO_URI=args.mongo_uri, MONGO_DATABASE=args.database)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env,
+        )
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        # Older commits have no /health/ready; there the app only answers once the model is loaded.
+        wait_until_ready(f"{base_url}/health/ready", timeout=600, fallback_url=f"{base_url}/")
+        print(f"Driving {base_url} with concurrency {args.concurrency}, {args.requests} requests each...")
+        results, metrics_text = asyncio.run(run_load(
+            base_url, args.endpoints, args.concurrency, args.requests, next_note, args.seed, args.warmup
+        ))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    commit, dirty = git_commit()
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report = {
+        "commit": commit + ("-dirty" if dirty else ""),
+        "timestamp": stamp,
+        "config": {key: value for key, value in vars(args).items() if key != "compare"},
+        "results": results,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    report_path = os.path.join(args.output_dir, f"{stamp}-{report['commit']}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    # The server's own histograms (per-route, per-stage, Mongo) from the same run.
+    with open(report_path[:-len(".json")] + ".prom", "w", encoding="utf-8") as f:
+        f.write(metrics_text)
+    print(f"Wrote {report_path}")
+
+
+if __name__ == "__main__":
+    main()
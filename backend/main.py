@@ -1,8 +1,33 @@
-from fastapi import FastAPI, HTTPException
+import os
+import re
+import json
+import time
+import base64
+import asyncio
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from transformers import pipeline
-import torch
-from db import connect_to_mongo, close_mongo_connection, get_database
+
+from db import connect_to_mongo, close_mongo_connection, ensure_patient_indexes, get_database, ping_mongo
+from cache import MongoCacheStore, ResultCache, make_cache_key
+from summarization import (
+    SUMMARY_PREFIX,
+    join_reports,
+    reports_content_hash,
+    summarize_long_text,
+    summarize_reports,
+)
+from summary_index import SUMMARIES_COLLECTION, make_summary_document, matches_model
+from inference import (
+    MODEL_NAME,
+    BatchingInferenceEngine,
+    EngineNotRunningError,
+    EngineOverloadedError,
+)
+from model_manager import ModelManager
+from metrics import REQUEST_LATENCY, render_gauges, render_metrics
 
 # Import the CORS middleware
 from fastapi.middleware.cors import CORSMiddleware
@@ -28,74 +53,491 @@ app.add_middleware(
 # --- END: NEW SECTION ---
 
 
-# Load AI model
-try:
-    device = 0 if torch.cuda.is_available() else -1
-    explainer_pipeline = pipeline("text2text-generation", model="t5-small", device=device)
-    print(f"Successfully loaded t5-small model on device: {'cuda' if device == 0 else 'cpu'}")
-except Exception as e:
-    print(f"Error loading model: {e}")
-    explainer_pipeline = None
+# --- Request timing ---
+# Every request is recorded in a latency histogram keyed by its route template
+# (e.g. /patients/{patient_id}), so per-patient URLs don't each become a series.
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=status,
+        )
+
+
+# --- AI model lifecycle ---
+# The backend (pytorch, pytorch-int8 or onnx, chosen with INFERENCE_BACKEND) loads in
+# the background after startup, so importing this module is fast. Under a preforking
+# server (see gunicorn.conf.py) PRELOAD_MODEL=1 loads the weights once in the master
+# before fork, and the workers share them copy-on-write.
+model_manager = ModelManager()
+if os.environ.get("PRELOAD_MODEL") == "1":
+    model_manager.preload()
+
+
+def require_model(unavailable_detail="AI model is not available."):
+    if model_manager.ready:
+        return
+    if model_manager.state == "failed":
+        raise HTTPException(status_code=503, detail=unavailable_detail)
+    raise HTTPException(status_code=503, detail="AI model is still loading. Please retry shortly.")
+
+
+def run_generation(texts, **params):
+    return model_manager.backend.generate(texts, **params)
+
+# --- Batched inference ---
+# Requests to /explain_note and /summarize_note are queued and grouped into padded
+# batches that run on a dedicated worker thread, keeping the event loop free.
+MAX_BATCH_SIZE = 8
+MAX_BATCH_WAIT_MS = 20
+MAX_QUEUE_SIZE = 256
+
+inference_engine = BatchingInferenceEngine(
+    run_generation,
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=MAX_BATCH_WAIT_MS,
+    max_queue_size=MAX_QUEUE_SIZE,
+)
+
+
+async def generate_text(input_text, **params):
+    """Runs one generation through the batching engine, mapping engine errors to HTTP errors."""
+    try:
+        return await inference_engine.submit(input_text, **params)
+    except EngineOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except EngineNotRunningError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+# --- Result cache ---
+# Generated text is cached by a hash of (task, normalized note text, generation params),
+# so repeat views of the same report skip generation entirely.
+CACHE_MAX_ENTRIES = 2048
+CACHE_TTL_SECONDS = 6 * 3600
+PERSISTENT_CACHE_ENABLED = True
+PERSISTENT_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+result_cache = ResultCache(
+    max_entries=CACHE_MAX_ENTRIES,
+    ttl_seconds=CACHE_TTL_SECONDS,
+    persistent_store=(
+        MongoCacheStore(get_database, ttl_seconds=PERSISTENT_CACHE_TTL_SECONDS)
+        if PERSISTENT_CACHE_ENABLED
+        else None
+    ),
+)
+
+
+async def cached_generate(task, medical_text, input_text, **params):
+    """Returns a cached generation for this note if there is one, otherwise generates it once."""
+    key = make_cache_key(task, medical_text, params, model=f"{MODEL_NAME}/{model_manager.active_backend_name}")
+    return await result_cache.get_or_compute(key, lambda: generate_text(input_text, **params))
 
 # Define request body model
 class MedicalNote(BaseModel):
     medical_text: str
 
+index_task = None
+
+
+async def build_patient_indexes(mongo_db):
+    started = time.perf_counter()
+    try:
+        await ensure_patient_indexes(mongo_db)
+    except Exception as e:
+        print(f"Could not create patient indexes: {e}")
+        return
+    print(f"Patient indexes ready in {time.perf_counter() - started:.1f}s.")
+
 # Event handler for application startup
 @app.on_event("startup")
 async def startup_event():
+    global index_task
     await connect_to_mongo()
+    mongo_db = await get_database()
+    if mongo_db is not None:
+        # Index builds (a text index over every report) and the name_lower backfill can
+        # take minutes on a large cohort, so they run alongside serving instead of before it.
+        index_task = asyncio.create_task(build_patient_indexes(mongo_db))
+    if result_cache.persistent_store:
+        try:
+            await result_cache.persistent_store.ensure_indexes()
+        except Exception as e:
+            print(f"Could not create cache indexes: {e}")
+    await inference_engine.start()
+    model_manager.start_background()
 
 # Event handler for application shutdown
 @app.on_event("shutdown")
 async def shutdown_event():
+    if index_task is not None and not index_task.done():
+        index_task.cancel()
+    await inference_engine.stop()
     await close_mongo_connection()
 
 @app.get("/")
 async def root():
     return {"message": "Hello World - GenAI Healthcare Assistant Backend is Running!"}
 
-@app.get("/patients")
-async def get_all_patients():
-    mongo_db = await get_database()
 
-    # CORRECTED LINE: We must check for None explicitly.
+@app.get("/health/ready")
+async def readiness():
+    """Reports model and MongoDB readiness separately; 503 until both are ready."""
+    mongo_ready = await ping_mongo()
+    body = {
+        "ready": model_manager.ready and mongo_ready,
+        "model": model_manager.status(),
+        "mongo": {"ready": mongo_ready},
+    }
+    return JSONResponse(status_code=200 if body["ready"] else 503, content=body)
+
+# --- Patient data access ---
+# The list view only needs demographics, so the (large) decoded report texts are
+# projected out and the collection is paged with a keyset cursor on `_id`.
+PATIENT_LIST_PROJECTION = {"reports_text": 0, "name_lower": 0}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 200
+
+
+async def get_mongo_db_or_503():
+    mongo_db = await get_database()
+    # We must check for None explicitly.
     if mongo_db is None:
         raise HTTPException(status_code=503, detail="Database service unavailable")
+    return mongo_db
+
+
+def serialize_patient(patient):
+    # MongoDB's _id may be a special ObjectId, we need to convert it to a string
+    # so it can be directly sent as JSON.
+    patient["_id"] = str(patient["_id"])
+    return patient
+
+
+@app.get("/patients")
+async def get_all_patients(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+):
+    mongo_db = await get_mongo_db_or_503()
+
+    query = {"_id": {"$gt": after}} if after else {}
+    # Fetch one extra document to find out whether there is another page.
+    patients_cursor = (
+        mongo_db.patients.find(query, PATIENT_LIST_PROJECTION)
+        .sort("_id", 1)
+        .limit(limit + 1)
+    )
+    patients_list = [serialize_patient(patient) async for patient in patients_cursor]
 
-    # Find all documents in the 'patients' collection
-    patients_cursor = mongo_db.patients.find({})
+    next_cursor = None
+    if len(patients_list) > limit:
+        patients_list = patients_list[:limit]
+        next_cursor = patients_list[-1]["_id"]
 
-    patients_list = []
-    async for patient in patients_cursor:
-        # MongoDB's _id is a special ObjectId, we need to convert it to a string
-        # so it can be directly sent as JSON.
-        patient["_id"] = str(patient["_id"])
-        patients_list.append(patient)
+    return {"patients": patients_list, "next_cursor": next_cursor}
 
-    return patients_list
+
+def encode_search_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+
+def decode_search_cursor(cursor):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        position = None
+    if not isinstance(position, dict):
+        raise HTTPException(status_code=400, detail="Invalid search cursor.")
+    return position
+
+
+def summarize_explain(explain_output):
+    """Pulls the timing and the winning plan's stages out of a MongoDB explain() result."""
+    stats = explain_output.get("executionStats", {})
+    stages = []
+    plan = explain_output.get("queryPlanner", {}).get("winningPlan", {})
+    plan = plan.get("queryPlan", plan)  # Newer servers nest the classic plan under queryPlan
+    while plan:
+        stage = plan.get("stage", "?")
+        stages.append(f"{stage} ({plan['indexName']})" if plan.get("indexName") else stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return {
+        "execution_time_ms": stats.get("executionTimeMillis"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+        "winning_plan": stages,
+    }
+
+
+@app.get("/patients/search")
+async def search_patients(
+    name: Optional[str] = Query(None, description="Case-insensitive name prefix"),
+    gender: Optional[str] = None,
+    birth_from: Optional[str] = Query(None, description="Earliest birthDate, YYYY-MM-DD"),
+    birth_to: Optional[str] = Query(None, description="Latest birthDate, YYYY-MM-DD"),
+    q: Optional[str] = Query(None, description="Keywords to find in report text"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    debug: bool = False,
+):
+    """
+    Searches patients by name prefix, gender, birthDate range and report keywords.
+    Keyword results are ranked by text relevance; the rest are ordered by name and
+    paged with a keyset cursor on (name_lower, _id), so deep pages cost the same as
+    the first. Relevance order has no stable key, so keyword pages still skip.
+    """
+    mongo_db = await get_mongo_db_or_503()
+
+    query = {}
+    if name and name.strip():
+        # An anchored, case-sensitive regex on the lowercased field can use the index.
+        query["name_lower"] = {"$regex": "^" + re.escape(name.strip().lower())}
+    if gender:
+        query["gender"] = gender.lower()
+    if birth_from or birth_to:
+        # birthDate is stored as an ISO date string, so string comparison orders correctly.
+        query["birthDate"] = {}
+        if birth_from:
+            query["birthDate"]["$gte"] = birth_from
+        if birth_to:
+            query["birthDate"]["$lte"] = birth_to
+    position = decode_search_cursor(after) if after else {}
+    keyword_search = bool(q and q.strip())
+    offset = 0
+    if keyword_search:
+        query["$text"] = {"$search": q.strip()}
+        projection = {"name": 1, "gender": 1, "birthDate": 1, "score": {"$meta": "textScore"}}
+        sort = [("score", {"$meta": "textScore"}), ("_id", 1)]
+        offset = position.get("offset", 0)
+    else:
+        # name_lower stays in the projection for the cursor and is dropped from the response.
+        projection = {"reports_text": 0}
+        sort = [("name_lower", 1), ("_id", 1)]
+        if position:
+            query["$or"] = [
+                {"name_lower": {"$gt": position.get("name_lower")}},
+                {"name_lower": position.get("name_lower"), "_id": {"$gt": position.get("_id")}},
+            ]
+
+    def find_page():
+        # Fetch one extra document to find out whether there is another page.
+        return mongo_db.patients.find(query, projection).sort(sort).skip(offset).limit(limit + 1)
+
+    started = time.perf_counter()
+    results = [serialize_patient(patient) async for patient in find_page()]
+    query_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        last = results[-1]
+        next_cursor = encode_search_cursor(
+            {"offset": offset + limit} if keyword_search else {"name_lower": last.get("name_lower"), "_id": last["_id"]}
+        )
+    for patient in results:
+        patient.pop("name_lower", None)
+    body = {"patients": results, "next_cursor": next_cursor}
+    if debug:
+        explain_cursor = find_page()
+        body["debug"] = {
+            "query": json.loads(json.dumps(query, default=str)),
+            "query_ms": query_ms,
+            "explain": summarize_explain(await explain_cursor.explain()),
+        }
+    return body
+
+
+@app.get("/patients/export")
+async def export_patients(include_reports: bool = True):
+    """Streams every patient as newline-delimited JSON, one document at a time."""
+    mongo_db = await get_mongo_db_or_503()
+    projection = None if include_reports else PATIENT_LIST_PROJECTION
+
+    async def stream_patients():
+        cursor = mongo_db.patients.find({}, projection).sort("_id", 1).batch_size(EXPORT_BATCH_SIZE)
+        async for patient in cursor:
+            yield json.dumps(serialize_patient(patient), default=str) + "\n"
+
+    return StreamingResponse(
+        stream_patients(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="patients.ndjson"'},
+    )
+
+
+@app.get("/patients/{patient_id}")
+async def get_patient(patient_id: str):
+    mongo_db = await get_mongo_db_or_503()
+    patient = await mongo_db.patients.find_one({"_id": patient_id})
+    if patient is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return serialize_patient(patient)
+
+
+async def generate_summary_chunk(chunk, **params):
+    # Chunk summaries go through the cache too, so re-summarizing a patient only
+    # regenerates the windows whose text actually changed.
+    return await cached_generate("summarize", chunk, SUMMARY_PREFIX + chunk, **params)
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/patients/{patient_id}/summary/stream")
+async def stream_patient_summary(patient_id: str):
+    """
+    Summarizes all of a patient's reports with chunked map-reduce, streaming each
+    partial chunk summary as a server-sent event before the final summary.
+    """
+    require_model()
+    mongo_db = await get_mongo_db_or_503()
+    patient = await mongo_db.patients.find_one({"_id": patient_id}, {"reports_text": 1})
+    if patient is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    full_text = join_reports(patient.get("reports_text", []))
+    if not full_text:
+        raise HTTPException(status_code=404, detail="Patient has no report text to summarize.")
+
+    async def event_stream():
+        try:
+            async for progress in summarize_long_text(full_text, model_manager.backend.tokenizer, generate_summary_chunk):
+                yield format_sse(progress.pop("event"), progress)
+        except HTTPException as e:
+            yield format_sse("error", {"detail": e.detail})
+        except Exception as e:
+            print(f"Error during patient summarization: {e}")
+            yield format_sse("error", {"detail": f"Failed to generate summary: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/patients/{patient_id}/summary")
+async def get_patient_summary(patient_id: str):
+    """
+    Serves the summary precomputed by summary_index.py. On a miss, or when the
+    stored summary is from another model, backend or version, it generates one live
+    and stores it.
+    """
+    mongo_db = await get_mongo_db_or_503()
+    stored = await mongo_db[SUMMARIES_COLLECTION].find_one({"_id": patient_id})
+    # Ingestion deletes the stored summary of every patient whose reports it rewrites,
+    # so a stored document is never stale and this path stays a single _id lookup.
+    if matches_model(stored, model_manager.active_backend_name):
+        return {
+            "patient_id": patient_id,
+            "summary": stored["summary"],
+            "source": "precomputed",
+            "model_name": stored["model_name"],
+            "backend": stored["backend"],
+            "model_version": stored["model_version"],
+            "content_hash": stored["content_hash"],
+            "truncated": stored.get("truncated", False),
+        }
+
+    require_model()
+    patient = await mongo_db.patients.find_one({"_id": patient_id}, {"reports_text": 1})
+    if patient is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    reports_text = patient.get("reports_text", [])
+    if not join_reports(reports_text):
+        raise HTTPException(status_code=404, detail="Patient has no report text to summarize.")
+
+    try:
+        result = await summarize_reports(reports_text, model_manager.backend.tokenizer, generate_summary_chunk)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error during patient summarization: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate summary: {str(e)}")
+
+    document = make_summary_document(
+        patient_id, reports_content_hash(reports_text), result, model_manager.backend.name
+    )
+    await mongo_db[SUMMARIES_COLLECTION].replace_one({"_id": patient_id}, document, upsert=True)
+    return {
+        "patient_id": patient_id,
+        "summary": document["summary"],
+        "source": "live",
+        "model_name": document["model_name"],
+        "backend": document["backend"],
+        "model_version": document["model_version"],
+        "content_hash": document["content_hash"],
+        "truncated": document["truncated"],
+    }
+
+
+@app.get("/inference/metrics")
+async def inference_metrics():
+    return inference_engine.metrics()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text format: latency histograms plus inference queue and cache gauges."""
+    engine = inference_engine.metrics()
+    cache = result_cache.stats()
+    extra = []
+    extra += render_gauges("inference_queue_depth", "Requests waiting for a batch.", {None: engine["queue_depth"]})
+    extra += render_gauges("inference_batches_total", "Batches run by the inference engine.",
+                           {None: engine["batches_run"]}, metric_type="counter")
+    extra += render_gauges("inference_requests_total", "Generation requests by outcome.", {
+        (("outcome", "served"),): engine["requests_served"],
+        (("outcome", "failed"),): engine["requests_failed"],
+    }, metric_type="counter")
+    extra += render_gauges("result_cache_lookups_total", "Result cache lookups by outcome.", {
+        (("outcome", "memory_hit"),): cache["memory_hits"],
+        (("outcome", "persistent_hit"),): cache["persistent_hits"],
+        (("outcome", "coalesced"),): cache["coalesced"],
+        (("outcome", "miss"),): cache["misses"],
+    }, metric_type="counter")
+    extra += render_gauges("result_cache_entries", "Entries in the in-process result cache.", {None: cache["size"]})
+    extra += render_gauges("model_ready", "1 once the model is loaded and warmed up.", {None: int(model_manager.ready)})
+    return PlainTextResponse(render_metrics(extra), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return result_cache.stats()
 
 
 @app.post("/explain_note")
 async def explain_note_endpoint(note: MedicalNote):
-    if not explainer_pipeline:
-        raise HTTPException(status_code=503, detail="Explainer model is not available.")
+    require_model("Explainer model is not available.")
     if not note.medical_text or not note.medical_text.strip():
         raise HTTPException(status_code=400, detail="Medical text cannot be empty.")
 
     try:
         input_text = f"summarize: {note.medical_text}"
-        explanation = explainer_pipeline(input_text, max_length=150, min_length=30, do_sample=False)
-        simplified_text = explanation[0]['generated_text']
+        simplified_text = await cached_generate("explain", note.medical_text, input_text, max_length=150, min_length=30, do_sample=False)
         return {"original_text": note.medical_text, "simplified_explanation": simplified_text}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error during explanation: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate explanation: {str(e)}")
     
 @app.post("/summarize_note")
 async def summarize_note_endpoint(note: MedicalNote):
-    if not explainer_pipeline:
-        raise HTTPException(status_code=503, detail="AI model is not available.")
+    require_model()
     if not note.medical_text or not note.medical_text.strip():
         raise HTTPException(status_code=400, detail="Medical text cannot be empty.")
 
@@ -104,11 +546,11 @@ async def summarize_note_endpoint(note: MedicalNote):
         # The "summarize: " prefix is what the t5-small model was trained on for this task.
         input_text = f"summarize: {note.medical_text}"
 
-        summary = explainer_pipeline(input_text, max_length=100, min_length=20, do_sample=False)
-
-        summary_text = summary[0]['generated_text']
+        summary_text = await cached_generate("summarize", note.medical_text, input_text, max_length=100, min_length=20, do_sample=False)
 
         return {"original_text": note.medical_text, "summary": summary_text}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error during summarization: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate summary: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import urllib.request
+import urllib.error
+
+from model_manager import memory_usage_mb
+
+# Starts the server, waits for /health/ready, and reports cold-start time plus the
+# memory of the master and every worker process (PSS/shared/private on Linux).
+#
+#   python measure_startup.py                        # single uvicorn process
+#   python measure_startup.py --gunicorn --workers 4 # preforked, weights shared
+
+
+def child_pids(pid):
+    """Direct children of `pid`, read from /proc (Linux)."""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # The ppid is the 4th field, after the parenthesised command name.
+                fields = f.read().rsplit(")", 1)[1].split()
+            if int(fields[1]) == pid:
+                children.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return children
+
+
+def wait_until_ready(url, timeout, fallback_url=None):
+    """
+    Polls `url` until it answers 200. If it 404s (a build without /health/ready) and a
+    `fallback_url` is given, polls that instead.
+    """
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 404 and fallback_url and url != fallback_url:
+                url = fallback_url
+                continue
+            if e.code != 503:
+                raise
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.1)
+    raise TimeoutError(f"{url} did not become ready within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start time and per-worker memory.")
+    parser.add_argument("--gunicorn", action="store_true", help="Run under gunicorn with preload (see gunicorn.conf.py)")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    if args.gunicorn:
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{args.port}",
+                   "--workers", str(args.workers), "main:app"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port)]
+
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        status = wait_until_ready(f"http://127.0.0.1:{args.port}/health/ready", args.timeout)
+        cold_start = time.perf_counter() - started
+        # With several workers only one answered the probe; give the rest a moment to warm up.
+        if args.gunicorn:
+            time.sleep(2)
+
+        print(f"Cold start to ready: {cold_start:.2f}s "
+              f"(model load {status['model']['load_seconds']}s, warm-up {status['model']['warmup_seconds']}s)")
+        processes = [("master" if args.gunicorn else "server", server.pid)]
+        processes += [("worker", pid) for pid in child_pids(server.pid)]
+        total_pss = 0.0
+        for role, pid in processes:
+            memory = memory_usage_mb(pid)
+            total_pss += memory.get("pss_mb", 0.0)
+            print(f"  {role:<7} pid {pid:<8} " + ", ".join(f"{key}={value}" for key, value in memory.items()))
+        if total_pss:
+            print(f"Total PSS across processes: {total_pss:.1f} MB")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond Mongo lookups to multi-second generations.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values` (0.0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class Histogram:
+    """A Prometheus-style cumulative histogram with one series per label set."""
+
+    def __init__(self, name, documentation, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()  # Observed from the inference thread and Mongo's monitoring threads
+
+    def observe(self, seconds, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += seconds
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            labels = list(zip(self.label_names, key))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', repr(bound))])} {count}")
+            count = series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+def render_gauges(name, documentation, values, metric_type="gauge"):
+    """Renders {label_tuple_or_None: value} as a gauge/counter family."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    for labels, value in values.items():
+        lines.append(f"{name}{_format_labels(labels or [])} {value}")
+    return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ["method", "route", "status"]
+)
+INFERENCE_STAGE_LATENCY = Histogram(
+    "inference_stage_duration_seconds", "Time per inference batch in each stage.", ["backend", "stage"]
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency as reported by the driver.", ["command", "outcome"]
+)
+
+
+def render_metrics(extra_lines=()):
+    lines = []
+    for histogram in (REQUEST_LATENCY, INFERENCE_STAGE_LATENCY, MONGO_COMMAND_LATENCY):
+        lines.extend(histogram.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,168 @@
+import gc
+import os
+import time
+import asyncio
+import threading
+
+from inference_backends import DEFAULT_BACKEND, PyTorchBackend, load_backend
+
+# Captured when the module is first imported, i.e. close to process start.
+PROCESS_STARTED = time.perf_counter()
+
+WARMUP_TEXT = "summarize: Patient presents with mild headache and is advised to rest and hydrate."
+
+# Only the fp32 CPU model loads without running compute: int8 quantization runs torch ops
+# and ONNX Runtime sessions start their own thread pools, neither of which survives fork.
+PRELOADABLE_BACKENDS = {PyTorchBackend.name}
+
+
+def preload_blocker(backend_name):
+    """Returns why `backend_name` can't be loaded before fork on this host, or None if it can."""
+    if backend_name not in PRELOADABLE_BACKENDS:
+        return f"the '{backend_name}' backend does work at load time that doesn't survive fork"
+    try:
+        import torch
+    except ImportError:
+        return None  # load_backend will report the missing dependency
+    # The NVML-based check answers without initialising CUDA in this process.
+    os.environ.setdefault("PYTORCH_NVML_BASED_CUDA_CHECK", "1")
+    if torch.cuda.is_available():
+        return "CUDA initialised in the master can't be used by forked workers"
+    return None
+
+
+def memory_usage_mb(pid="self"):
+    """
+    Memory of a process (this one by default) in MB. On Linux this includes PSS and
+    the shared/private split from smaps_rollup, which shows how much model memory
+    forked workers share.
+    """
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+        usage = {
+            "rss_mb": fields.get("Rss", 0) / 1024,
+            "pss_mb": fields.get("Pss", 0) / 1024,
+            "shared_mb": (fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024,
+            "private_mb": (fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024,
+        }
+    except OSError:
+        try:
+            import psutil
+            process = psutil.Process() if pid == "self" else psutil.Process(int(pid))
+            usage = {"rss_mb": process.memory_info().rss / (1024 * 1024)}
+        except (ImportError, OSError):
+            pass
+    return {key: round(value, 1) for key, value in usage.items()}
+
+
+class ModelManager:
+    """
+    Owns the inference backend's lifecycle: loading off the event loop, a warm-up
+    generation, and readiness/timing reporting.
+
+    In a preforking server, call preload() in the master before workers fork. The
+    weights are then shared copy-on-write, and each worker only runs its own warm-up.
+    """
+
+    def __init__(self, backend_name=None):
+        self.backend_name = backend_name
+        self.backend = None
+        self.state = "not_started"  # not_started -> loading -> ready | failed
+        self.error = None
+        self.preloaded = False
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.ready_after_seconds = None
+        self._lock = threading.Lock()
+        self._task = None
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    @property
+    def active_backend_name(self):
+        """The backend in use, or the one that will be loaded if it isn't yet."""
+        return self.backend.name if self.backend else (self.backend_name or DEFAULT_BACKEND)
+
+    def _load_weights(self):
+        started = time.perf_counter()
+        self.backend = load_backend(self.backend_name)
+        self.load_seconds = round(time.perf_counter() - started, 3)
+
+    def _warm_up(self):
+        started = time.perf_counter()
+        self.backend.generate([WARMUP_TEXT], max_length=16, min_length=1)
+        self.warmup_seconds = round(time.perf_counter() - started, 3)
+
+    def load_sync(self):
+        """Loads (unless preloaded) and warms up the backend. Safe to call from a worker thread."""
+        with self._lock:
+            if self.ready:
+                return
+            self.state = "loading"
+            try:
+                if self.backend is None:
+                    self._load_weights()
+                self._warm_up()
+            except Exception as e:
+                print(f"Error loading model: {e}")
+                self.error = str(e)
+                self.state = "failed"
+                return
+            self.ready_after_seconds = round(time.perf_counter() - PROCESS_STARTED, 3)
+            self.state = "ready"
+            print(f"Model ready {self.ready_after_seconds}s after process start "
+                  f"(load {self.load_seconds}s, warm-up {self.warmup_seconds}s).")
+
+    def preload(self):
+        """
+        Loads the weights in the current (master) process without running any
+        generation. Generating before fork would start the math library's thread
+        pools, which do not survive fork. gc.freeze() moves everything allocated so far
+        out of the collector's reach, so workers don't dirty (and copy) those pages.
+
+        Backends that can't be loaded safely before fork (see preload_blocker) are
+        skipped, and each worker loads its own copy in load_sync() instead.
+        """
+        reason = preload_blocker(self.backend_name or DEFAULT_BACKEND)
+        if reason:
+            print(f"Not preloading the model: {reason}. Each worker will load its own copy.")
+            return
+        try:
+            self._load_weights()
+        except Exception as e:
+            print(f"Error preloading model: {e}")
+            self.error = str(e)
+            self.state = "failed"
+            return
+        self.preloaded = True
+        gc.collect()
+        gc.freeze()
+        print(f"Preloaded model weights in {self.load_seconds}s before forking workers.")
+
+    def start_background(self):
+        """Starts loading on a worker thread; the event loop keeps serving meanwhile."""
+        if self._task is None and self.state != "failed":
+            self._task = asyncio.get_running_loop().run_in_executor(None, self.load_sync)
+        return self._task
+
+    def status(self):
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "backend": self.active_backend_name,
+            "error": self.error,
+            "preloaded": self.preloaded,
+            "pid": os.getpid(),
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "ready_after_seconds": self.ready_after_seconds,
+            "memory": memory_usage_mb(),
+        }
@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import itertools
+
+# t5-small sees at most 512 tokens; leave room for the "summarize: " prefix and </s>.
+SUMMARY_PREFIX = "summarize: "
+CHUNK_TOKENS = 480
+CHUNK_OVERLAP_TOKENS = 64
+# Each reduce round shrinks the text roughly 4x, so this is only a safety net for a
+# reduction that stops converging; normal inputs finish long before it.
+MAX_REDUCE_ROUNDS = 8
+REPORT_SEPARATOR = "\n\n"
+
+# Bump when chunking or generation settings change, so stored summaries get recomputed.
+SUMMARY_PIPELINE_VERSION = "mapreduce-v1"
+
+CHUNK_SUMMARY_PARAMS = {"max_length": 100, "min_length": 20, "do_sample": False}
+FINAL_SUMMARY_PARAMS = {"max_length": 150, "min_length": 40, "do_sample": False}
+
+
+def split_into_windows(token_ids, window=CHUNK_TOKENS, overlap=CHUNK_OVERLAP_TOKENS):
+    """Splits a token id list into windows of `window` tokens, each overlapping the previous by `overlap`."""
+    if overlap >= window:
+        raise ValueError("overlap must be smaller than window")
+    if len(token_ids) <= window:
+        return [token_ids]
+    step = window - overlap
+    windows = []
+    for start in range(0, len(token_ids), step):
+        windows.append(token_ids[start:start + window])
+        if start + window >= len(token_ids):
+            break
+    return windows
+
+
+def chunk_text(tokenizer, text, window=CHUNK_TOKENS, overlap=CHUNK_OVERLAP_TOKENS):
+    """
+    Tokenizes `text` once and returns the decoded text of each overlapping token
+    window, plus the total token count.
+    """
+    token_ids = tokenizer(text, add_special_tokens=False)["input_ids"]
+    windows = split_into_windows(token_ids, window, overlap)
+    return tokenizer.batch_decode(windows, skip_special_tokens=True), len(token_ids)
+
+
+async def summarize_long_text(text, tokenizer, generate):
+    """
+    Hierarchical (map-reduce) summarization for text longer than the model's context window.
+
+    `generate(text, **params)` is an async callable that produces one summary. All
+    chunks of a round are submitted at once, so the batching engine can run them
+    together. This is an async generator of progress events:
+
+        {"event": "partial", "round": r, "index": i, "total": n, "summary": ...}
+        {"event": "summary", "rounds": r, "chunks": n, "summary": ...,
+         "truncated": bool, "dropped_tokens": t}
+
+    Rounds repeat until the partial summaries fit in a single window. `truncated` is
+    only set if the safety net stops a reduction that no longer shrinks the text.
+    """
+    loop = asyncio.get_running_loop()
+    current = text
+    total_chunks = 0
+    previous_tokens = None
+
+    for round_number in itertools.count(1):
+        # Tokenizing a long report is CPU work, so keep it off the event loop.
+        chunks, n_tokens = await loop.run_in_executor(None, chunk_text, tokenizer, current)
+        total_chunks += len(chunks)
+
+        truncated = len(chunks) > 1 and (
+            round_number > MAX_REDUCE_ROUNDS or (previous_tokens is not None and n_tokens >= previous_tokens)
+        )
+        if len(chunks) == 1 or truncated:
+            dropped_tokens = max(0, n_tokens - CHUNK_TOKENS) if truncated else 0
+            if truncated:
+                print(f"Summary reduction stopped converging after {round_number - 1} rounds; "
+                      f"final pass drops {dropped_tokens} of {n_tokens} tokens.")
+            summary = await generate(chunks[0], **FINAL_SUMMARY_PARAMS)
+            yield {
+                "event": "summary",
+                "rounds": round_number,
+                "chunks": total_chunks,
+                "summary": summary,
+                "truncated": truncated,
+                "dropped_tokens": dropped_tokens,
+            }
+            return
+        previous_tokens = n_tokens
+
+        async def summarize_chunk(index, chunk):
+            return index, await generate(chunk, **CHUNK_SUMMARY_PARAMS)
+
+        tasks = [asyncio.ensure_future(summarize_chunk(i, chunk)) for i, chunk in enumerate(chunks)]
+        partials = [None] * len(chunks)
+        try:
+            for finished in asyncio.as_completed(tasks):
+                index, summary = await finished
+                partials[index] = summary
+                yield {
+                    "event": "partial",
+                    "round": round_number,
+                    "index": index,
+                    "total": len(chunks),
+                    "summary": summary,
+                }
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        current = " ".join(partials)
+
+
+def join_reports(reports_text):
+    return REPORT_SEPARATOR.join(report.strip() for report in reports_text if report and report.strip())
+
+
+def reports_content_hash(reports_text):
+    """Stable hash of a patient's report texts, used to detect when a stored summary is stale."""
+    return hashlib.sha256(join_reports(reports_text).encode("utf-8")).hexdigest()
+
+
+async def summarize_reports(reports_text, tokenizer, generate):
+    """Runs summarize_long_text to completion and returns only the final event."""
+    final = None
+    async for progress in summarize_long_text(join_reports(reports_text), tokenizer, generate):
+        if progress["event"] == "summary":
+            final = progress
+    return final
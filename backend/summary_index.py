@@ -0,0 +1,184 @@
+import asyncio
+import argparse
+import time
+from datetime import datetime, timezone
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne
+from pymongo.errors import ConnectionFailure
+
+from inference import MODEL_NAME, BatchingInferenceEngine
+from inference_backends import DEFAULT_BACKEND, load_backend
+from summarization import (
+    SUMMARY_PIPELINE_VERSION,
+    SUMMARY_PREFIX,
+    join_reports,
+    reports_content_hash,
+    summarize_reports,
+)
+
+# --- Configuration ---
+MONGO_CONNECTION_STRING = "mongodb://localhost:27017"
+DATABASE_NAME = "healthcare_assistant_db"
+PATIENTS_COLLECTION = "patients"
+SUMMARIES_COLLECTION = "patient_summaries"
+DEFAULT_CONCURRENCY = 16  # Patients summarized at once; their chunks share engine batches
+DEFAULT_WRITE_BATCH_SIZE = 100
+ID_PAGE_SIZE = 1000
+
+
+async def iter_patient_ids(patients, page_size=None):
+    """
+    Yields every patient _id in order, one keyset page at a time. Each page's cursor is
+    drained immediately, so no server cursor sits idle (and gets reaped) while the
+    CPU-bound summarization runs.
+    """
+    page_size = page_size or ID_PAGE_SIZE
+    last_id = None
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        page = await patients.find(query, {"_id": 1}).sort("_id", 1).limit(page_size).to_list(length=page_size)
+        if not page:
+            return
+        for doc in page:
+            yield doc["_id"]
+        last_id = page[-1]["_id"]
+
+
+def make_summary_document(patient_id, content_hash, result, backend_name):
+    return {
+        "_id": patient_id,
+        "summary": result["summary"],
+        "model_name": MODEL_NAME,
+        "backend": backend_name,
+        "model_version": SUMMARY_PIPELINE_VERSION,
+        "content_hash": content_hash,
+        "chunks": result["chunks"],
+        "rounds": result["rounds"],
+        "truncated": result.get("truncated", False),
+        "dropped_tokens": result.get("dropped_tokens", 0),
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+def matches_model(summary_doc, backend_name):
+    """True if the summary was produced by the current model, backend and summarization version."""
+    return (
+        summary_doc is not None
+        and summary_doc.get("model_name") == MODEL_NAME
+        and summary_doc.get("backend") == backend_name
+        and summary_doc.get("model_version") == SUMMARY_PIPELINE_VERSION
+    )
+
+
+def is_current(summary_doc, content_hash, backend_name):
+    return matches_model(summary_doc, backend_name) and summary_doc.get("content_hash") == content_hash
+
+
+async def build_summary_index(database, tokenizer, generate, concurrency=DEFAULT_CONCURRENCY,
+                              write_batch_size=DEFAULT_WRITE_BATCH_SIZE, force=False, backend_name=DEFAULT_BACKEND):
+    """
+    Summarizes every patient whose reports (or the summarization model, backend or
+    version) changed since their stored summary, and upserts the results into
+    `patient_summaries`. `backend_name` is the inference backend behind `generate`.
+    Returns a dict of counts.
+    """
+    patients = database[PATIENTS_COLLECTION]
+    summaries = database[SUMMARIES_COLLECTION]
+
+    # Only the fields needed for the staleness check; the summaries themselves stay in Mongo.
+    existing = {}
+    async for doc in summaries.find({}, {"model_name": 1, "backend": 1, "model_version": 1, "content_hash": 1}):
+        existing[doc["_id"]] = doc
+
+    counts = {"scanned": 0, "unchanged": 0, "summarized": 0, "empty": 0, "failed": 0}
+    operations = []
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+
+    async def summarize_one(patient_id, reports_text, content_hash):
+        async with semaphore:
+            try:
+                result = await summarize_reports(reports_text, tokenizer, generate)
+            except Exception as e:
+                print(f"Failed to summarize patient {patient_id}: {e}")
+                counts["failed"] += 1
+                return
+        operations.append(ReplaceOne(
+            {"_id": patient_id}, make_summary_document(patient_id, content_hash, result, backend_name), upsert=True
+        ))
+        counts["summarized"] += 1
+
+    pending = set()
+    async for patient_id in iter_patient_ids(patients):
+        # Reports are fetched per patient, so only the ones being summarized stay in memory.
+        patient = await patients.find_one({"_id": patient_id}, {"reports_text": 1})
+        if patient is None:
+            continue  # Removed since its id was listed
+        counts["scanned"] += 1
+        reports_text = patient.get("reports_text", [])
+        if not join_reports(reports_text):
+            counts["empty"] += 1
+            continue
+        content_hash = reports_content_hash(reports_text)
+        if not force and is_current(existing.get(patient["_id"]), content_hash, backend_name):
+            counts["unchanged"] += 1
+            continue
+
+        pending.add(asyncio.ensure_future(summarize_one(patient["_id"], reports_text, content_hash)))
+        # Keep the number of scheduled patients bounded instead of queueing the whole cohort.
+        if len(pending) >= concurrency * 2:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        if len(operations) >= write_batch_size:
+            batch = operations[:]
+            operations.clear()
+            await summaries.bulk_write(batch, ordered=False)
+
+    if pending:
+        await asyncio.wait(pending)
+    if operations:
+        await summaries.bulk_write(operations, ordered=False)
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Summary index: {counts['summarized']} summarized, {counts['unchanged']} unchanged, "
+        f"{counts['empty']} without reports, {counts['failed']} failed "
+        f"({counts['scanned']} scanned in {elapsed:.1f}s)"
+    )
+    return counts
+
+
+async def run_index_build(mongo_uri=MONGO_CONNECTION_STRING, concurrency=DEFAULT_CONCURRENCY, force=False):
+    """Loads the model, starts a local batching engine and builds the summary index."""
+    print("--- SUMMARY INDEX START ---")
+    try:
+        client = AsyncIOMotorClient(mongo_uri)
+        await client.admin.command('ismaster')
+    except ConnectionFailure as e:
+        print(f"MongoDB connection failed: {e}")
+        return None
+
+    inference_backend = load_backend()
+    # Offline there are no latency constraints, so prefer bigger batches.
+    engine = BatchingInferenceEngine(inference_backend.generate, max_batch_size=32, max_wait_ms=50)
+    await engine.start()
+
+    async def generate(chunk, **params):
+        return await engine.submit(SUMMARY_PREFIX + chunk, **params)
+
+    try:
+        return await build_summary_index(
+            client[DATABASE_NAME], inference_backend.tokenizer, generate,
+            concurrency=concurrency, force=force, backend_name=inference_backend.name,
+        )
+    finally:
+        await engine.stop()
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute per-patient report summaries.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--force", action="store_true", help="Recompute every summary")
+    parser.add_argument("--mongo-uri", default=MONGO_CONNECTION_STRING)
+    args = parser.parse_args()
+    asyncio.run(run_index_build(args.mongo_uri, args.concurrency, args.force))
@@ -0,0 +1,95 @@
+import os
+import json
+import uuid
+import base64
+import random
+import argparse
+
+# Generates small Synthea-like FHIR bundles (Patient + DiagnosticReport with base64
+# presentedForm) for exercising the ingestion pipeline and the API without a real
+# Synthea install.
+
+GIVEN_NAMES = ["Ana", "Ben", "Chloe", "David", "Elena", "Farid", "Grace", "Hiro", "Isla", "Jamal", "Kira", "Liam"]
+FAMILY_NAMES = ["Garcia", "Smith", "Nguyen", "Okafor", "Schmidt", "Kowalski", "Patel", "Rossi", "Larsen", "Haddad"]
+FINDINGS = [
+    "Patient reports intermittent chest discomfort on exertion, relieved by rest.",
+    "Blood pressure remains elevated despite adherence to lisinopril 10 mg daily.",
+    "HbA1c of 7.8% indicates suboptimal glycemic control; metformin dose increased.",
+    "Chest X-ray shows no acute cardiopulmonary process.",
+    "Mild bilateral lower extremity edema noted on examination.",
+    "Lipid panel: LDL 162 mg/dL, HDL 38 mg/dL, triglycerides 210 mg/dL.",
+    "Patient counseled on smoking cessation and referred to a support program.",
+    "Seasonal allergic rhinitis managed with intranasal corticosteroids.",
+    "Follow-up spirometry demonstrates improvement in FEV1 after inhaler adjustment.",
+    "No new neurological deficits; gait steady, reflexes symmetric.",
+]
+
+
+def make_report_text(rng, sentences):
+    return " ".join(rng.choice(FINDINGS) for _ in range(sentences))
+
+
+def make_patient_record(rng, n_reports=3, sentences_per_report=6):
+    """Returns a patient document shaped like the ones load_synthea_data.py stores."""
+    name = f"{rng.choice(GIVEN_NAMES)}{rng.randint(1, 999)} {rng.choice(FAMILY_NAMES)}{rng.randint(1, 999)}"
+    return {
+        "_id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "name": name,
+        "name_lower": name.lower(),
+        "gender": rng.choice(["male", "female"]),
+        "birthDate": f"{rng.randint(1930, 2020)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "reports_text": [make_report_text(rng, sentences_per_report) for _ in range(n_reports)],
+    }
+
+
+def make_bundle(record):
+    """Wraps a patient record in a FHIR transaction bundle like Synthea's output."""
+    given, family = record["name"].split(" ", 1)
+    entries = [{
+        "fullUrl": f"urn:uuid:{record['_id']}",
+        "resource": {
+            "resourceType": "Patient",
+            "id": record["_id"],
+            "name": [{"use": "official", "family": family, "given": [given]}],
+            "gender": record["gender"],
+            "birthDate": record["birthDate"],
+        },
+    }]
+    for text in record["reports_text"]:
+        report_id = str(uuid.uuid4())
+        entries.append({
+            "fullUrl": f"urn:uuid:{report_id}",
+            "resource": {
+                "resourceType": "DiagnosticReport",
+                "id": report_id,
+                "status": "final",
+                "subject": {"reference": f"urn:uuid:{record['_id']}"},
+                "presentedForm": [{
+                    "contentType": "text/plain; charset=utf-8",
+                    "data": base64.b64encode(text.encode("utf-8")).decode("ascii"),
+                }],
+            },
+        })
+    return {"resourceType": "Bundle", "type": "transaction", "entry": entries}
+
+
+def write_bundles(output_dir, patients, seed=0, n_reports=3, sentences_per_report=6):
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    for _ in range(patients):
+        record = make_patient_record(rng, n_reports, sentences_per_report)
+        file_name = f"{record['name'].replace(' ', '_')}_{record['_id']}.json"
+        with open(os.path.join(output_dir, file_name), "w", encoding="utf-8") as f:
+            json.dump(make_bundle(record), f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic Synthea-like FHIR bundles.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--patients", type=int, default=100)
+    parser.add_argument("--reports", type=int, default=3, help="DiagnosticReports per patient")
+    parser.add_argument("--sentences", type=int, default=6, help="Sentences per report")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_bundles(args.output_dir, args.patients, args.seed, args.reports, args.sentences)
+    print(f"Wrote {args.patients} bundles to {args.output_dir}")
@@ -0,0 +1,16 @@
+import os
+import sys
+
+# The backend modules import each other as top-level modules (e.g. `from db import ...`),
+# exactly as they do when uvicorn is started from backend/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class WordTokenizer:
+    """Stand-in tokenizer: one token per whitespace-separated word."""
+
+    def __call__(self, text, add_special_tokens=False):
+        return {"input_ids": text.split()}
+
+    def batch_decode(self, windows, skip_special_tokens=True):
+        return [" ".join(window) for window in windows]
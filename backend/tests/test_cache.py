@@ -0,0 +1,154 @@
+import asyncio
+import time
+
+import pytest
+
+from cache import ResultCache, make_cache_key
+
+
+class CountingCompute:
+    """compute() factory that counts calls and can be held until released."""
+
+    def __init__(self, value="generated", error=None):
+        self.value = value
+        self.error = error
+        self.calls = 0
+        self.release = None
+
+    def __call__(self):
+        self.calls += 1
+        return self._run()
+
+    async def _run(self):
+        if self.release is not None:
+            await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class DictStore:
+    """In-memory stand-in for MongoCacheStore."""
+
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value):
+        self.values[key] = value
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = ResultCache(max_entries=2)
+
+    async def scenario():
+        for key in ("a", "b"):
+            await cache.get_or_compute(key, CountingCompute(key))
+        await cache.get_or_compute("a", CountingCompute())  # "a" is now the most recently used
+        await cache.get_or_compute("c", CountingCompute("c"))
+        recompute_b = CountingCompute("b")
+        await cache.get_or_compute("b", recompute_b)
+        return recompute_b.calls
+
+    assert asyncio.run(scenario()) == 1
+    assert cache.evictions == 2
+    assert cache.memory_hits == 1
+
+
+def test_expired_entries_are_recomputed():
+    cache = ResultCache(ttl_seconds=0.05)
+    compute = CountingCompute()
+
+    async def scenario():
+        await cache.get_or_compute("k", compute)
+        await cache.get_or_compute("k", compute)
+        time.sleep(0.06)
+        await cache.get_or_compute("k", compute)
+
+    asyncio.run(scenario())
+    assert compute.calls == 2
+    assert cache.expirations == 1
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = ResultCache()
+    compute = CountingCompute()
+
+    async def scenario():
+        compute.release = asyncio.Event()
+        waiters = [asyncio.create_task(cache.get_or_compute("k", compute)) for _ in range(5)]
+        await asyncio.sleep(0)
+        compute.release.set()
+        return await asyncio.gather(*waiters)
+
+    assert asyncio.run(scenario()) == ["generated"] * 5
+    assert compute.calls == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_cancelled_waiter_does_not_cancel_the_computation_for_others():
+    cache = ResultCache()
+    compute = CountingCompute()
+
+    async def scenario():
+        compute.release = asyncio.Event()
+        leaving = asyncio.create_task(cache.get_or_compute("k", compute))
+        staying = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        compute.release.set()
+        return await staying
+
+    assert asyncio.run(scenario()) == "generated"
+    assert compute.calls == 1
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    cache = ResultCache(persistent_store=DictStore())
+    failing = CountingCompute(error=RuntimeError("model failed"))
+
+    async def scenario():
+        failing.release = asyncio.Event()
+        waiters = [asyncio.create_task(cache.get_or_compute("k", failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        failing.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        retry = await cache.get_or_compute("k", CountingCompute("recovered"))
+        return results, retry
+
+    results, retry = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert failing.calls == 1
+    assert retry == "recovered"
+    assert cache.persistent_store.values == {"k": "recovered"}
+
+
+def test_persistent_tier_serves_after_memory_is_cleared():
+    store = DictStore()
+    cache = ResultCache(persistent_store=store)
+    compute = CountingCompute()
+
+    async def scenario():
+        await cache.get_or_compute("k", compute)
+        cache.clear()
+        return await cache.get_or_compute("k", compute)
+
+    assert asyncio.run(scenario()) == "generated"
+    assert compute.calls == 1
+    assert cache.persistent_hits == 1
+
+
+@pytest.mark.parametrize("changed", [
+    {"task": "explain"},
+    {"params": {"max_length": 50}},
+    {"model": "t5-small/onnx"},
+])
+def test_cache_key_changes_with_task_params_and_model(changed):
+    base = {"task": "summarize", "text": "Patient  stable.", "params": {"max_length": 100}, "model": "t5-small/pytorch"}
+    assert make_cache_key(**base) != make_cache_key(**dict(base, **changed))
+    # Whitespace differences in the note don't change the key.
+    assert make_cache_key(**base) == make_cache_key(**dict(base, text="Patient stable. "))
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from inference import BatchingInferenceEngine, EngineNotRunningError, EngineOverloadedError
+
+
+class RecordingGenerate:
+    """generate_fn that records each batch and can be held mid-generation."""
+
+    def __init__(self, hold=False):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def __call__(self, texts, **params):
+        self.batches.append((list(texts), params))
+        self.started.set()
+        self.release.wait(5)
+        return [text.upper() for text in texts]
+
+
+async def wait_for_generation(generate):
+    while not generate.started.is_set():
+        await asyncio.sleep(0.001)
+
+
+def test_requests_are_batched_only_with_matching_params():
+    generate = RecordingGenerate()
+
+    async def scenario():
+        engine = BatchingInferenceEngine(generate, max_batch_size=8, max_wait_ms=50)
+        await engine.start()
+        try:
+            return await asyncio.gather(
+                engine.submit("a", max_length=10),
+                engine.submit("b", max_length=20),
+                engine.submit("c", max_length=10),
+                engine.submit("d", max_length=20),
+                engine.submit("e", max_length=10),
+            )
+        finally:
+            await engine.stop()
+
+    assert asyncio.run(scenario()) == ["A", "B", "C", "D", "E"]
+    assert generate.batches == [(["a", "c", "e"], {"max_length": 10}), (["b", "d"], {"max_length": 20})]
+
+
+def test_batch_closes_at_max_wait_or_when_full():
+    generate = RecordingGenerate()
+
+    async def scenario():
+        engine = BatchingInferenceEngine(generate, max_batch_size=2, max_wait_ms=100)
+        await engine.start()
+        try:
+            started = time.perf_counter()
+            await engine.submit("alone")
+            lone_wait = time.perf_counter() - started
+
+            started = time.perf_counter()
+            await asyncio.gather(engine.submit("x"), engine.submit("y"))
+            full_wait = time.perf_counter() - started
+            return lone_wait, full_wait
+        finally:
+            await engine.stop()
+
+    lone_wait, full_wait = asyncio.run(scenario())
+    # A lone request waits out max_wait for company; a full batch goes straight away.
+    assert lone_wait >= 0.09
+    assert full_wait < 0.09
+    assert [texts for texts, _ in generate.batches] == [["alone"], ["x", "y"]]
+
+
+def test_full_queue_rejects_with_overloaded_error():
+    generate = RecordingGenerate(hold=True)
+
+    async def scenario():
+        engine = BatchingInferenceEngine(generate, max_batch_size=1, max_wait_ms=1, max_queue_size=1)
+        await engine.start()
+        try:
+            running = asyncio.create_task(engine.submit("running"))
+            await wait_for_generation(generate)
+            queued = asyncio.create_task(engine.submit("queued"))
+            await asyncio.sleep(0)
+            with pytest.raises(EngineOverloadedError):
+                await engine.submit("rejected")
+            generate.release.set()
+            return await asyncio.gather(running, queued)
+        finally:
+            await engine.stop()
+
+    assert asyncio.run(scenario()) == ["RUNNING", "QUEUED"]
+
+
+def test_stop_fails_the_batch_in_flight_and_queued_requests():
+    generate = RecordingGenerate(hold=True)
+
+    async def scenario():
+        engine = BatchingInferenceEngine(generate, max_batch_size=1, max_wait_ms=1)
+        await engine.start()
+        running = asyncio.create_task(engine.submit("running"))
+        await wait_for_generation(generate)
+        queued = asyncio.create_task(engine.submit("queued"))
+        await asyncio.sleep(0)
+        try:
+            await engine.stop()
+            results = await asyncio.wait_for(asyncio.gather(running, queued, return_exceptions=True), 1)
+        finally:
+            generate.release.set()
+            await asyncio.sleep(0.05)  # Let the abandoned generation thread finish
+        with pytest.raises(EngineNotRunningError):
+            await engine.submit("late")
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, EngineNotRunningError) for result in results)
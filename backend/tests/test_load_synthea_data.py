@@ -0,0 +1,170 @@
+import os
+import json
+import base64
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from load_synthea_data import COLLECTION_NAME, DATABASE_NAME, MANIFEST_FILE_NAME, load_data
+from summary_index import SUMMARIES_COLLECTION
+from synthetic_synthea import write_bundles
+
+
+@pytest.fixture
+def bundle_dir(tmp_path):
+    write_bundles(str(tmp_path), patients=6, seed=3, n_reports=2, sentences_per_report=3)
+    return tmp_path
+
+
+@pytest.fixture
+def client():
+    return mongomock_motor.AsyncMongoMockClient()
+
+
+def run_load(bundle_dir, client, **kwargs):
+    return asyncio.run(load_data(input_dir=str(bundle_dir), workers=2, batch_size=4, client=client, **kwargs))
+
+
+def stored_patients(client):
+    async def fetch():
+        return {doc["_id"]: doc async for doc in client[DATABASE_NAME][COLLECTION_NAME].find({})}
+    return asyncio.run(fetch())
+
+
+def bundle_files(bundle_dir):
+    return sorted(name for name in os.listdir(bundle_dir) if name.endswith(".json") and name != MANIFEST_FILE_NAME)
+
+
+def read_bundle(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_first_run_upserts_every_patient_with_decoded_reports(bundle_dir, client):
+    stats = run_load(bundle_dir, client)
+
+    assert stats.files == 6
+    assert stats.records == 6
+    patients = stored_patients(client)
+    assert len(patients) == 6
+    for file_name in bundle_files(bundle_dir):
+        bundle = read_bundle(bundle_dir / file_name)
+        patient = bundle["entry"][0]["resource"]
+        expected_reports = [
+            base64.b64decode(entry["resource"]["presentedForm"][0]["data"]).decode("utf-8")
+            for entry in bundle["entry"][1:]
+        ]
+        stored = patients[patient["id"]]
+        assert stored["gender"] == patient["gender"]
+        assert stored["birthDate"] == patient["birthDate"]
+        assert stored["name_lower"] == stored["name"].lower()
+        assert stored["reports_text"] == expected_reports
+    assert (bundle_dir / MANIFEST_FILE_NAME).exists()
+
+
+def test_second_run_processes_no_files(bundle_dir, client):
+    run_load(bundle_dir, client)
+    stats = run_load(bundle_dir, client)
+
+    assert stats.files == 0
+    assert stats.records == 0
+    assert stats.unchanged == 6  # The manifest file itself is never treated as a bundle
+
+
+def test_touched_bundle_is_rechecked_but_not_rewritten(bundle_dir, client):
+    run_load(bundle_dir, client)
+    touched = bundle_dir / bundle_files(bundle_dir)[0]
+    stat = os.stat(touched)
+    os.utime(touched, (stat.st_atime, stat.st_mtime + 10))
+
+    stats = run_load(bundle_dir, client)
+
+    assert stats.files == 1
+    assert stats.records == 0  # Same content hash, so nothing is re-upserted
+
+
+def test_changed_bundle_reupserts_only_its_patient(bundle_dir, client):
+    run_load(bundle_dir, client)
+    changed = bundle_dir / bundle_files(bundle_dir)[0]
+    bundle = read_bundle(changed)
+    patient_id = bundle["entry"][0]["resource"]["id"]
+    new_report = "Updated note: blood pressure now well controlled."
+    bundle["entry"][1]["resource"]["presentedForm"][0]["data"] = base64.b64encode(new_report.encode()).decode()
+    with open(changed, "w", encoding="utf-8") as f:
+        json.dump(bundle, f)
+    stat = os.stat(changed)
+    os.utime(changed, (stat.st_atime, stat.st_mtime + 10))
+
+    stats = run_load(bundle_dir, client)
+
+    assert stats.files == 1
+    assert stats.records == 1
+    patients = stored_patients(client)
+    assert len(patients) == 6
+    assert patients[patient_id]["reports_text"][0] == new_report
+
+
+def test_deleted_bundle_prunes_its_patient(bundle_dir, client):
+    run_load(bundle_dir, client)
+    removed = bundle_dir / bundle_files(bundle_dir)[0]
+    patient_id = read_bundle(removed)["entry"][0]["resource"]["id"]
+    os.remove(removed)
+
+    stats = run_load(bundle_dir, client)
+
+    assert stats.files == 0
+    patients = stored_patients(client)
+    assert len(patients) == 5
+    assert patient_id not in patients
+
+
+def test_full_run_rewrites_everything_and_still_prunes_deleted_bundles(bundle_dir, client):
+    run_load(bundle_dir, client)
+    removed = bundle_dir / bundle_files(bundle_dir)[0]
+    patient_id = read_bundle(removed)["entry"][0]["resource"]["id"]
+    os.remove(removed)
+
+    stats = run_load(bundle_dir, client, full=True)
+
+    assert stats.files == 5
+    assert stats.records == 5
+    assert patient_id not in stored_patients(client)
+    # Nothing left for a later run to prune.
+    assert run_load(bundle_dir, client).files == 0
+
+
+def test_bulk_write_failure_fails_the_run_and_keeps_the_manifest(bundle_dir, client, monkeypatch):
+    async def failing_bulk_write(self, operations, ordered=True):
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(type(client[DATABASE_NAME][COLLECTION_NAME]), "bulk_write", failing_bulk_write)
+
+    assert run_load(bundle_dir, client) is None
+    assert not (bundle_dir / MANIFEST_FILE_NAME).exists()
+
+
+def test_changed_and_deleted_patients_lose_their_precomputed_summaries(bundle_dir, client):
+    run_load(bundle_dir, client)
+    files = bundle_files(bundle_dir)
+    changed_id = read_bundle(bundle_dir / files[0])["entry"][0]["resource"]["id"]
+    deleted_id = read_bundle(bundle_dir / files[1])["entry"][0]["resource"]["id"]
+    untouched_id = read_bundle(bundle_dir / files[2])["entry"][0]["resource"]["id"]
+    summaries = client[DATABASE_NAME][SUMMARIES_COLLECTION]
+    asyncio.run(summaries.insert_many([{"_id": pid, "summary": "old"} for pid in (changed_id, deleted_id, untouched_id)]))
+
+    changed = bundle_dir / files[0]
+    bundle = read_bundle(changed)
+    bundle["entry"][0]["resource"]["gender"] = "other"
+    with open(changed, "w", encoding="utf-8") as f:
+        json.dump(bundle, f)
+    stat = os.stat(changed)
+    os.utime(changed, (stat.st_atime, stat.st_mtime + 10))
+    os.remove(bundle_dir / files[1])
+
+    run_load(bundle_dir, client)
+
+    async def remaining():
+        return [doc["_id"] async for doc in summaries.find({})]
+    assert asyncio.run(remaining()) == [untouched_id]
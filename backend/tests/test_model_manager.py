@@ -0,0 +1,19 @@
+import pytest
+
+import model_manager
+from model_manager import ModelManager, preload_blocker
+
+
+@pytest.mark.parametrize("backend_name", ["pytorch-int8", "onnx"])
+def test_preload_skips_backends_that_do_work_at_load_time(monkeypatch, backend_name):
+    def fail(name=None):
+        raise AssertionError("preload must not load this backend in the master")
+    monkeypatch.setattr(model_manager, "load_backend", fail)
+
+    manager = ModelManager(backend_name)
+    manager.preload()
+
+    assert preload_blocker(backend_name) is not None
+    assert not manager.preloaded
+    assert manager.backend is None
+    assert manager.state == "not_started"  # Left for each worker's load_sync()
@@ -0,0 +1,52 @@
+import asyncio
+
+import summarization
+from conftest import WordTokenizer
+from summarization import CHUNK_TOKENS, split_into_windows, summarize_long_text
+
+
+def run_summary(text, generate):
+    async def collect():
+        return [event async for event in summarize_long_text(text, WordTokenizer(), generate)]
+    return asyncio.run(collect())
+
+
+def test_windows_overlap_and_cover_every_token():
+    windows = split_into_windows(list(range(1000)), window=480, overlap=64)
+    assert [(w[0], w[-1]) for w in windows] == [(0, 479), (416, 895), (832, 999)]
+
+
+def test_long_text_is_reduced_until_one_window_without_dropping_input():
+    seen = []
+
+    async def generate(chunk, **params):
+        words = chunk.split()
+        seen.extend(words)
+        # Keep the first and last word of every chunk so the tail stays traceable.
+        return " ".join(words[:20] + words[-20:])
+
+    words = [f"w{i}" for i in range(40000)]
+    events = run_summary(" ".join(words), generate)
+
+    final = events[-1]
+    assert final["event"] == "summary"
+    assert final["truncated"] is False
+    assert final["dropped_tokens"] == 0
+    assert final["rounds"] > 2
+    # The very last word of the input made it into the map phase and survives to the summary.
+    assert words[-1] in seen
+    assert words[-1] in final["summary"].split()
+
+
+def test_non_converging_reduction_reports_truncation(monkeypatch):
+    monkeypatch.setattr(summarization, "MAX_REDUCE_ROUNDS", 3)
+
+    async def generate(chunk, **params):
+        return chunk  # Never shrinks, so the safety net has to stop it.
+
+    events = run_summary(" ".join(f"w{i}" for i in range(2000)), generate)
+
+    final = events[-1]
+    assert final["truncated"] is True
+    assert final["dropped_tokens"] > 0
+    assert len(final["summary"].split()) <= CHUNK_TOKENS
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import summary_index
+from conftest import WordTokenizer
+from summary_index import PATIENTS_COLLECTION, SUMMARIES_COLLECTION, build_summary_index, iter_patient_ids
+
+
+def build(database, calls, backend_name="pytorch"):
+    async def generate(chunk, **params):
+        calls.append(chunk)
+        return " ".join(chunk.split()[:10])
+
+    return asyncio.run(build_summary_index(
+        database, WordTokenizer(), generate, concurrency=2, backend_name=backend_name
+    ))
+
+
+@pytest.fixture
+def database(monkeypatch):
+    # Small pages so the keyset paging is exercised across several pages.
+    monkeypatch.setattr(summary_index, "ID_PAGE_SIZE", 2)
+    database = mongomock_motor.AsyncMongoMockClient()["test_db"]
+    asyncio.run(database[PATIENTS_COLLECTION].insert_many([
+        {"_id": f"p{i}", "reports_text": [f"report {i} " + "finding " * 30]} for i in range(5)
+    ] + [{"_id": "empty", "reports_text": []}]))
+    return database
+
+
+def test_builds_every_summary_then_only_recomputes_changed_patients(database):
+    calls = []
+    counts = build(database, calls)
+    assert counts["summarized"] == 5
+    assert counts["empty"] == 1
+
+    async def summary_ids():
+        return sorted([doc["_id"] async for doc in database[SUMMARIES_COLLECTION].find({})])
+    assert asyncio.run(summary_ids()) == [f"p{i}" for i in range(5)]
+
+    asyncio.run(database[PATIENTS_COLLECTION].update_one({"_id": "p3"}, {"$set": {"reports_text": ["new note"]}}))
+    calls.clear()
+    counts = build(database, calls)
+    assert counts["summarized"] == 1
+    assert counts["unchanged"] == 4
+    assert calls == ["new note"]
+
+
+def test_switching_backend_makes_every_stored_summary_stale(database):
+    build(database, [])
+
+    counts = build(database, [], backend_name="onnx")
+    assert counts["summarized"] == 5
+    assert counts["unchanged"] == 0
+
+    async def backends():
+        return {doc["backend"] async for doc in database[SUMMARIES_COLLECTION].find({})}
+    assert asyncio.run(backends()) == {"onnx"}
+
+
+def test_patient_ids_are_paged_by_keyset(database):
+    finds = []
+
+    class CountingCollection:
+        def __init__(self, collection):
+            self.collection = collection
+
+        def find(self, query, projection):
+            finds.append(query)
+            return self.collection.find(query, projection)
+
+    async def collect():
+        return [pid async for pid in iter_patient_ids(CountingCollection(database[PATIENTS_COLLECTION]))]
+
+    # 6 ids in pages of 2, then one empty page to end.
+    assert asyncio.run(collect()) == sorted(["empty"] + [f"p{i}" for i in range(5)])
+    assert finds == [{}, {"_id": {"$gt": "p0"}}, {"_id": {"$gt": "p2"}}, {"_id": {"$gt": "p4"}}]
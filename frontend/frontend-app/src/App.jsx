@@ -1,4 +1,5 @@
 import React, { useState } from 'react';
+import axios from 'axios';
 import PatientExplanation from './components/PatientExplanation';
 import PatientList from './components/PatientList';
 import PatientDetails from './components/PatientDetails';
@@ -8,8 +9,15 @@ function App() {
   const [selectedPatient, setSelectedPatient] = useState(null);
   const [noteToExplain, setNoteToExplain] = useState('');
 
-  const handlePatientSelect = (patient) => {
-    setSelectedPatient(patient);
+  // The list only carries demographics, so fetch the full record (with reports) on selection.
+  const handlePatientSelect = async (patient) => {
+    try {
+      const response = await axios.get(`http://127.0.0.1:8000/patients/${encodeURIComponent(patient._id)}`);
+      setSelectedPatient(response.data);
+    } catch (err) {
+      console.error(err);
+      setSelectedPatient({ ...patient, reports_text: [] });
+    }
   };
 
   const handleExplainNote = (noteText) => {
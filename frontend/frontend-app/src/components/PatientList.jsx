@@ -4,25 +4,65 @@ import axios from 'axios';
 // The component now accepts a function `onPatientSelect` as a prop
 function PatientList({ onPatientSelect }) {
   const [patients, setPatients] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [isLoading, setIsLoading] = useState(true);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [error, setError] = useState('');
+  const [searchName, setSearchName] = useState('');
+  const [searchKeywords, setSearchKeywords] = useState('');
+  const [searchResults, setSearchResults] = useState(null); // null when not searching
+
+  // The backend returns one page at a time; `after` is the cursor from the previous page.
+  const fetchPatients = async (after) => {
+    try {
+      const response = await axios.get('http://127.0.0.1:8000/patients', {
+        params: after ? { after } : {},
+      });
+      setPatients((previous) => (after ? [...previous, ...response.data.patients] : response.data.patients));
+      setNextCursor(response.data.next_cursor);
+    } catch (err) {
+      setError('Failed to fetch patients. Please ensure the backend is running.');
+      console.error(err);
+    }
+  };
 
   useEffect(() => {
-    const fetchPatients = async () => {
-      try {
-        const response = await axios.get('http://127.0.0.1:8000/patients');
-        setPatients(response.data);
-      } catch (err) {
-        setError('Failed to fetch patients. Please ensure the backend is running.');
-        console.error(err);
-      } finally {
-        setIsLoading(false);
-      }
-    };
-
-    fetchPatients();
+    fetchPatients().finally(() => setIsLoading(false));
   }, []);
 
+  const handleLoadMore = async () => {
+    setIsLoadingMore(true);
+    await fetchPatients(nextCursor);
+    setIsLoadingMore(false);
+  };
+
+  // Searching happens server-side against indexed fields instead of filtering the loaded page.
+  const handleSearch = async (event) => {
+    event.preventDefault();
+    if (!searchName.trim() && !searchKeywords.trim()) {
+      setSearchResults(null);
+      return;
+    }
+    try {
+      const params = {};
+      if (searchName.trim()) params.name = searchName.trim();
+      if (searchKeywords.trim()) params.q = searchKeywords.trim();
+      const response = await axios.get('http://127.0.0.1:8000/patients/search', { params });
+      setSearchResults(response.data.patients);
+    } catch (err) {
+      setError('Failed to search patients. Please ensure the backend is running.');
+      console.error(err);
+    }
+  };
+
+  const handleClearSearch = () => {
+    setSearchName('');
+    setSearchKeywords('');
+    setSearchResults(null);
+  };
+
+  const visiblePatients = searchResults ?? patients;
+
   if (isLoading) {
     return <p>Loading patients...</p>;
   }
@@ -35,9 +75,34 @@ function PatientList({ onPatientSelect }) {
     <div className="card">
       <div className="card-body">
         <h5 className="card-title">Patient List</h5>
+        <form className="row g-2 mb-3" onSubmit={handleSearch}>
+          <div className="col">
+            <input
+              className="form-control form-control-sm"
+              value={searchName}
+              onChange={(e) => setSearchName(e.target.value)}
+              placeholder="Name starts with..."
+            />
+          </div>
+          <div className="col">
+            <input
+              className="form-control form-control-sm"
+              value={searchKeywords}
+              onChange={(e) => setSearchKeywords(e.target.value)}
+              placeholder="Keywords in reports..."
+            />
+          </div>
+          <div className="col-auto">
+            <button type="submit" className="btn btn-primary btn-sm">Search</button>
+            {searchResults && (
+              <button type="button" className="btn btn-link btn-sm" onClick={handleClearSearch}>Clear</button>
+            )}
+          </div>
+        </form>
+        {searchResults && searchResults.length === 0 && <p>No matching patients.</p>}
         <div className="list-group">
           {/* Changed from <ul> to <div>, and <li> to <button> */}
-          {patients.map((patient) => (
+          {visiblePatients.map((patient) => (
             <button
               key={patient._id}
               type="button"
@@ -48,6 +113,16 @@ function PatientList({ onPatientSelect }) {
             </button>
           ))}
         </div>
+        {!searchResults && nextCursor && (
+          <button
+            type="button"
+            className="btn btn-outline-primary btn-sm mt-3"
+            onClick={handleLoadMore}
+            disabled={isLoadingMore}
+          >
+            {isLoadingMore ? 'Loading...' : 'Load more patients'}
+          </button>
+        )}
       </div>
     </div>
   );